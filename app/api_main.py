@@ -1,18 +1,23 @@
 # app/api_main.py
 
 import re
+import time
+import threading
+import numpy as np
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Body, Response
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
 import os
 import sys
-from pinecone import Pinecone, ServerlessSpec
 import uvicorn
 from fastapi.responses import StreamingResponse
 import json
 
 from db import Feedback, init_db, get_db, create_conversation, add_message, add_source, add_feedback, Conversation, Message, Source
+from db import SessionLocal, get_conversation_summary, save_conversation_summary
 from sqlalchemy import and_
 from sqlalchemy.orm import Session, aliased
 
@@ -22,8 +27,11 @@ from starlette.responses import StreamingResponse as StarletteStreamingResponse
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from utils.config import config
 from core.embeddings import EmbeddingManager
-from core.vector_store import VectorStore
-from core.llm import LLMManager
+from core.embedding_batcher import QueryEmbeddingBatcher
+from core.vector_store import create_vector_store, all_namespaces
+from core.metadata_filter import validate_filter
+from core.llm import LLMManager, strip_references
+from core.reranker import CrossEncoderReranker
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -44,6 +52,9 @@ class ChatRequest(BaseModel):
     max_history: Optional[int] = 10
     include_sources: Optional[bool] = False
     conversation_id: Optional[int] = None
+    namespaces: Optional[List[str]] = None  # source partitions to search; default all
+    # Pinecone-style metadata filter, e.g. {"content_type": "table"} or {"source": {"$in": ["a.pdf"]}}
+    filters: Optional[Dict[str, Any]] = None
 
 class FeedbackRequest(BaseModel):
     user_id: int
@@ -76,11 +87,25 @@ class FeedbackResponse(BaseModel):
 class HealthResponse(BaseModel):
     status: str
     message: str
+    live: bool = True
+    ready: bool = False
+    timings: Optional[Dict[str, float]] = None
 
 # Global variables for components
 embedding_manager = None
 vector_store = None
 llm_manager = None
+query_batcher = None
+reranker = None
+
+# Startup bookkeeping for liveness/readiness reporting
+_process_start = time.perf_counter()
+startup_timings: Dict[str, float] = {}
+initialization_error: Optional[str] = None
+
+# Conversations whose summary is being updated; a turn finishing meanwhile is folded in next time
+_summaries_in_flight = set()
+_summaries_lock = threading.Lock()
 
 def check_environment():
     """Check if all required environment variables are set."""
@@ -88,65 +113,201 @@ def check_environment():
     
     if not config.OPENAI_API_KEY:
         missing_vars.append("OPENAI_API_KEY")
-    if not config.PINECONE_API_KEY:
-        missing_vars.append("PINECONE_API_KEY")
-    if not config.PINECONE_ENVIRONMENT:
-        missing_vars.append("PINECONE_ENVIRONMENT")
+    if config.VECTOR_STORE_BACKEND == "pinecone":
+        if not config.PINECONE_API_KEY:
+            missing_vars.append("PINECONE_API_KEY")
+        if not config.PINECONE_ENVIRONMENT:
+            missing_vars.append("PINECONE_ENVIRONMENT")
     
     if missing_vars:
         error_msg = f"Missing required environment variables: {', '.join(missing_vars)}"
         raise ValueError(error_msg)
 
+def validate_namespaces(namespaces: Optional[List[str]]):
+    """Reject namespaces the vector store doesn't partition by."""
+    unknown = sorted(set(namespaces or []) - set(all_namespaces()))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown namespaces {unknown}; expected some of {all_namespaces()}")
+
+def validate_filters(filters: Optional[Dict[str, Any]]):
+    """Reject filters on fields the vector index doesn't store, or unsupported operators."""
+    try:
+        validate_filter(filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filters: {str(e)}")
+
+def load_embedding_manager():
+    """Load the embedding model and warm it up."""
+    manager = EmbeddingManager()
+    manager.warm_up()
+    return manager
+
+def load_reranker():
+    """Load and warm up the cross-encoder, or return None when reranking is disabled or unavailable."""
+    if not config.RERANKER_ENABLED:
+        return None
+    try:
+        model = CrossEncoderReranker()
+        model.warm_up()
+        return model
+    except Exception as e:
+        # Reranking is an optimization; serve in retrieval order rather than fail startup
+        print(f"⚠️ Reranker disabled, failed to load {config.RERANKER_MODEL}: {str(e)}")
+        return None
+
 def initialize_components():
     """Initialize all components needed for the RAG system."""
     try:
         # Check environment variables first
         check_environment()
         
-        # Initialize Pinecone
-        pc = Pinecone(
-            api_key=config.PINECONE_API_KEY,
-            environment=config.PINECONE_ENVIRONMENT
-        )
-        
-        # Verify Pinecone index exists and is accessible
-        index = pc.Index(config.PINECONE_INDEX_NAME)
-        
-        # Initialize components
-        embedding_manager = EmbeddingManager()
-        vector_store = VectorStore()
-        llm_manager = LLMManager()
-        
-        return embedding_manager, vector_store, llm_manager
+        # The components are independent, so load them concurrently;
+        # the vector store verifies its index itself.
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            embedding_future = executor.submit(load_embedding_manager)
+            vector_store_future = executor.submit(create_vector_store)
+            llm_future = executor.submit(LLMManager)
+            reranker_future = executor.submit(load_reranker)
+            return (embedding_future.result(), vector_store_future.result(), llm_future.result(),
+                    reranker_future.result())
         
     except Exception as e:
         raise Exception(f"Initialization Error: {str(e)}")
 
-# Startup event
-@app.on_event("startup")
-async def startup_event():
-    """Initialize components on startup."""
-    global embedding_manager, vector_store, llm_manager
+def initialize_in_background():
+    """Load components off the event loop and publish them once all are ready."""
+    global embedding_manager, vector_store, llm_manager, query_batcher, reranker, initialization_error
     try:
-        init_db()
-        embedding_manager, vector_store, llm_manager = initialize_components()
-        print("✅ All components initialized successfully")
+        components = initialize_components()
+        if config.QUERY_BATCHING_ENABLED:
+            query_batcher = QueryEmbeddingBatcher(components[0])
+        embedding_manager, vector_store, llm_manager, reranker = components
+        startup_timings["time_to_ready"] = time.perf_counter() - _process_start
+        print(f"✅ All components initialized successfully (time to ready: {startup_timings['time_to_ready']:.1f}s)")
     except Exception as e:
+        initialization_error = str(e)
         print(f"❌ Failed to initialize components: {str(e)}")
-        raise e
 
-# Health check endpoint
+def components_ready() -> bool:
+    return embedding_manager is not None and vector_store is not None and llm_manager is not None
+
+async def embed_query(text: str) -> np.ndarray:
+    """Embed a query without blocking the event loop, coalescing concurrent requests when enabled."""
+    if query_batcher is not None:
+        return await query_batcher.embed_query(text)
+    return await asyncio.get_running_loop().run_in_executor(None, embedding_manager.embed_query, text)
+
+def prompt_history(db, conversation_id: int, before_message_id: int, chat_history: List[Dict],
+                   max_history: int) -> List[Dict]:
+    """History for the prompt: the conversation's rolling summary plus the stored messages it
+    doesn't cover yet, or the request's own history when nothing is stored."""
+    if not config.CONVERSATION_SUMMARY_ENABLED:
+        return chat_history
+    summary = get_conversation_summary(db, conversation_id)
+    recent = db.query(Message).filter(
+        Message.conversation_id == conversation_id,
+        Message.id > (summary.summarized_through if summary else 0),
+        Message.id < before_message_id
+    ).order_by(Message.id.desc()).limit(max_history).all()
+    if summary is None and not recent:
+        return chat_history
+
+    history = [{"role": msg.role, "content": strip_references(msg.content)} for msg in reversed(recent)]
+    if summary is not None:
+        history.insert(0, {"role": "summary", "content": summary.summary})
+    return history
+
+def update_conversation_summary(conversation_id: int):
+    """Fold all but the last CONVERSATION_VERBATIM_TURNS exchanges into the conversation's summary."""
+    with _summaries_lock:
+        if conversation_id in _summaries_in_flight:
+            return
+        _summaries_in_flight.add(conversation_id)
+    db = SessionLocal()
+    try:
+        summary = get_conversation_summary(db, conversation_id)
+        pending = db.query(Message).filter(
+            Message.conversation_id == conversation_id,
+            Message.id > (summary.summarized_through if summary else 0)
+        ).order_by(Message.id).all()
+        fold = pending[:max(0, len(pending) - 2 * config.CONVERSATION_VERBATIM_TURNS)]
+        if not fold:
+            return
+        updated = llm_manager.summarize_conversation(
+            summary.summary if summary else "",
+            [{"role": msg.role, "content": msg.content} for msg in fold]
+        )
+        save_conversation_summary(db, conversation_id, updated, fold[-1].id)
+    except Exception as e:
+        print(f"⚠️ Failed to update the summary of conversation {conversation_id}: {str(e)}")
+    finally:
+        db.close()
+        with _summaries_lock:
+            _summaries_in_flight.discard(conversation_id)
+
+def schedule_summary_update(conversation_id: int):
+    """Update the conversation summary off the request path, after the turn has been stored."""
+    if config.CONVERSATION_SUMMARY_ENABLED:
+        asyncio.get_running_loop().run_in_executor(None, update_conversation_summary, conversation_id)
+
+def retrieval_depth(context_window: int) -> int:
+    """How many chunks to retrieve: over-fetch for the reranker when it is loaded."""
+    if reranker is None:
+        return context_window
+    return max(context_window, config.RERANKER_CANDIDATES)
+
+async def rerank_docs(query: str, docs: List[Dict], context_window: int) -> List[Dict]:
+    """Keep the best chunks by cross-encoder score, within the reranker's time budget."""
+    if reranker is None:
+        return docs[:context_window]
+    k = min(context_window, config.RERANKER_TOP_K)
+    return await asyncio.get_running_loop().run_in_executor(None, reranker.rerank, query, docs, k)
+
+# Startup event
+@app.on_event("startup")
+async def startup_event():
+    """Start accepting connections immediately and initialize components in the background."""
+    init_db()
+    app.state.initialization = asyncio.get_running_loop().run_in_executor(None, initialize_in_background)
+    startup_timings["time_to_listening"] = time.perf_counter() - _process_start
+    print(f"🚀 Accepting connections after {startup_timings['time_to_listening']:.1f}s; loading components in the background")
+
+# Health check endpoints
 @app.get("/health", response_model=HealthResponse)
-async def health_check():
-    """Health check endpoint to verify API is running."""
-    if embedding_manager is None or vector_store is None or llm_manager is None:
-        raise HTTPException(status_code=503, detail="Service components not initialized")
+async def health_check(response: Response):
+    """Report liveness and readiness of the API; 503 until every component is loaded."""
+    ready = components_ready()
+    if initialization_error:
+        status, message = "failed", f"Initialization failed: {initialization_error}"
+    elif ready:
+        status, message = "healthy", "RAG Chatbot API is running successfully"
+    else:
+        status, message = "starting", "RAG Chatbot API is loading its components"
+    if not ready:
+        response.status_code = 503
     
     return HealthResponse(
-        status="healthy",
-        message="RAG Chatbot API is running successfully"
+        status=status,
+        message=message,
+        live=initialization_error is None,
+        ready=ready,
+        timings=startup_timings
     )
 
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness probe: the process is up, and will not become ready without a restart if this fails."""
+    if initialization_error:
+        raise HTTPException(status_code=503, detail=f"Initialization failed: {initialization_error}")
+    return {"live": True}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: all components are loaded and queries can be served."""
+    if not components_ready():
+        raise HTTPException(status_code=503, detail=initialization_error or "Service components not initialized")
+    return {"ready": True}
+
 # Main chat endpoint (non-streaming, legacy)
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
@@ -156,6 +317,8 @@ async def chat(request: ChatRequest):
     # Check if components are initialized
     if embedding_manager is None or vector_store is None or llm_manager is None:
         raise HTTPException(status_code=503, detail="Service components not initialized")
+    validate_namespaces(request.namespaces)
+    validate_filters(request.filters)
     
     try:
         db = next(get_db())
@@ -169,14 +332,18 @@ async def chat(request: ChatRequest):
         user_msg = add_message(db, conversation_id, "user", request.message)
         
         # Generate embedding for the user query
-        query_embedding = embedding_manager.generate_embeddings([request.message])[0]
+        query_embedding = await embed_query(request.message)
         
         # Search for relevant documents
-        relevant_docs = vector_store.search(
+        relevant_docs = await asyncio.to_thread(
+            vector_store.search,
             request.message,
             query_embedding,
-            k=request.context_window
+            k=retrieval_depth(request.context_window),
+            namespaces=request.namespaces,
+            filter=request.filters
         )
+        relevant_docs = await rerank_docs(request.message, relevant_docs, request.context_window)
         
         # Convert chat history to the format expected by LLM manager
         chat_history = []
@@ -190,15 +357,20 @@ async def chat(request: ChatRequest):
         if len(chat_history) > request.max_history:
             chat_history = chat_history[-request.max_history:]
         
-        # Generate response using LLM manager
-        response = llm_manager.generate_response(
+        # Generate response using LLM manager, off the event loop
+        history = await asyncio.to_thread(
+            prompt_history, db, conversation_id, user_msg.id, chat_history, request.max_history
+        )
+        response = await asyncio.to_thread(
+            llm_manager.generate_response,
             request.message,
             relevant_docs,
-            chat_history
+            history
         )
         
         # Store assistant message
         assistant_msg = add_message(db, conversation_id, "assistant", response)
+        schedule_summary_update(conversation_id)
         
         # Prepare sources if requested
         sources = []
@@ -234,6 +406,8 @@ async def chat_stream(request: ChatRequest):
     global embedding_manager, vector_store, llm_manager
     if embedding_manager is None or vector_store is None or llm_manager is None:
         raise HTTPException(status_code=503, detail="Service components not initialized")
+    validate_namespaces(request.namespaces)
+    validate_filters(request.filters)
 
     try:
         db = next(get_db())
@@ -245,22 +419,35 @@ async def chat_stream(request: ChatRequest):
             conversation_id = conv.id
         # Store user message
         user_msg = add_message(db, conversation_id, "user", request.message)
-        query_embedding = embedding_manager.generate_embeddings([request.message])[0]
-        relevant_docs = vector_store.search(
+        query_embedding = await embed_query(request.message)
+        relevant_docs = await asyncio.to_thread(
+            vector_store.search,
             request.message,
             query_embedding,
-            k=request.context_window
+            k=retrieval_depth(request.context_window),
+            namespaces=request.namespaces,
+            filter=request.filters
         )
+        relevant_docs = await rerank_docs(request.message, relevant_docs, request.context_window)
         chat_history = [
             {"role": msg.role, "content": msg.content}
             for msg in request.chat_history
         ]
         if len(chat_history) > request.max_history:
             chat_history = chat_history[-request.max_history:]
+        chat_history = await asyncio.to_thread(
+            prompt_history, db, conversation_id, user_msg.id, chat_history, request.max_history
+        )
 
-        def token_stream():
+        def store_answer(response: str):
+            assistant_msg = add_message(db, conversation_id, "assistant", response)
+            for doc in relevant_docs:
+                add_source(db, assistant_msg.id, doc["text"], doc.get("metadata", {}))
+
+        async def token_stream():
+            # Consumed on the event loop; no threadpool worker is held while tokens arrive
             response_accum = ""
-            for token in llm_manager.stream_response(
+            async for token in llm_manager.astream_response(
                 request.message,
                 relevant_docs,
                 chat_history
@@ -268,9 +455,8 @@ async def chat_stream(request: ChatRequest):
                 response_accum += token
                 yield token
             # Store assistant message and sources after streaming is done
-            assistant_msg = add_message(db, conversation_id, "assistant", response_accum)
-            for doc in relevant_docs:
-                add_source(db, assistant_msg.id, doc["text"], doc.get("metadata", {}))
+            await asyncio.get_running_loop().run_in_executor(None, store_answer, response_accum)
+            schedule_summary_update(conversation_id)
         
         # Set conversation_id in response header so frontend can persist it
         headers = {"conversation_id": str(conversation_id)}
@@ -419,19 +605,26 @@ async def get_response():
 
 # Endpoint to search documents only
 @app.post("/search")
-async def search_documents(query: str, k: int = 5):
+async def search_documents(query: str, k: int = 5, namespace: Optional[str] = None,
+                           filters: Optional[Dict[str, Any]] = Body(default=None, embed=True)):
     """Search for relevant documents without generating a response."""
     global embedding_manager, vector_store
     
     if embedding_manager is None or vector_store is None:
         raise HTTPException(status_code=503, detail="Service components not initialized")
+    if namespace is not None:
+        validate_namespaces([namespace])
+    validate_filters(filters)
     
     try:
         # Generate embedding for the query
-        query_embedding = embedding_manager.generate_embeddings([query])[0]
+        query_embedding = await embed_query(query)
         
         # Search for relevant documents
-        relevant_docs = vector_store.search(query, query_embedding, k=k)
+        relevant_docs = await asyncio.to_thread(
+            vector_store.search,
+            query, query_embedding, k=k, namespaces=[namespace] if namespace is not None else None, filter=filters
+        )
         
         # Format response
         sources = []
@@ -447,19 +640,41 @@ async def search_documents(query: str, k: int = 5):
         raise HTTPException(status_code=500, detail=f"Error searching documents: {str(e)}")
 
 
+# Endpoint to get cache statistics
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters for the in-process caches."""
+    if embedding_manager is None or vector_store is None or llm_manager is None:
+        raise HTTPException(status_code=503, detail="Service components not initialized")
+    return {
+        "query_embeddings": embedding_manager.query_cache.stats(),
+        "retrieval_results": vector_store.cache_stats(),
+        "answers": llm_manager.answer_cache_stats()
+    }
+
+# Endpoint to get embedding batcher metrics
+@app.get("/metrics")
+async def get_metrics():
+    """Embedding micro-batcher histograms, reranker counters, LLM time to first token and prompt size."""
+    return {
+        "embedding_batcher": query_batcher.stats() if query_batcher is not None else None,
+        "reranker": reranker.stats() if reranker is not None else None,
+        "llm_time_to_first_token": llm_manager.ttft_stats() if llm_manager is not None else None,
+        "llm_prompt_tokens": llm_manager.prompt_token_stats() if llm_manager is not None else None
+    }
+
 # Endpoint to get system information
 @app.get("/info")
 async def get_system_info():
     """Get system information and configuration."""
     return {
         "app_title": config.APP_TITLE,
+        "vector_store_backend": config.VECTOR_STORE_BACKEND,
+        "vector_namespaces": all_namespaces(),
         "pinecone_index": config.PINECONE_INDEX_NAME,
         "environment": config.PINECONE_ENVIRONMENT,
-        "components_initialized": all([
-            embedding_manager is not None,
-            vector_store is not None,
-            llm_manager is not None
-        ])
+        "components_initialized": components_ready(),
+        "startup_timings": startup_timings
     }
 
 # Endpoint to fetch conversation history by conversation_id
@@ -501,9 +716,13 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "health": "/health",
+            "liveness": "/health/live",
+            "readiness": "/health/ready",
             "chat": "/chat",
             "feedback": "/chat/feedback",
             "search": "/search",
+            "cache_stats": "/cache/stats",
+            "metrics": "/metrics",
             "info": "/info",
             "docs": "/docs"
         }
@@ -34,6 +34,13 @@ class Source(Base):
     meta = Column(JSON, nullable=True)
     message = relationship('Message', back_populates='sources')
 
+class ConversationSummary(Base):
+    __tablename__ = 'conversation_summaries'
+    conversation_id = Column(Integer, ForeignKey('conversations.id'), primary_key=True)
+    summary = Column(Text, nullable=False)
+    summarized_through = Column(Integer, nullable=False)  # id of the last message folded into the summary
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 
 class Feedback(Base):
     __tablename__ = 'ai_assistant_feedback'
@@ -89,6 +96,22 @@ def add_source(db, message_id, text, metadata=None):
 
     return src 
 
+# Helper to get the rolling summary of a conversation (None until one is written)
+def get_conversation_summary(db, conversation_id):
+    return db.query(ConversationSummary).filter(ConversationSummary.conversation_id == conversation_id).first()
+
+# Helper to create or replace the rolling summary of a conversation
+def save_conversation_summary(db, conversation_id, summary, summarized_through):
+    row = get_conversation_summary(db, conversation_id)
+    if row is None:
+        row = ConversationSummary(conversation_id=conversation_id)
+        db.add(row)
+    row.summary = summary
+    row.summarized_through = summarized_through
+    db.commit()
+    db.refresh(row)
+    return row
+
 # Helper to add feedback to the database
 def add_feedback(db, user_id, username, user_full_name, feedback_type, conversation_id, time_saved, rating, recommend, liked_aspects, other_liked, improvement_suggestions, issues, other_feedback):
     feedback = Feedback(user_id=user_id, username=username, user_full_name=user_full_name, feedback_type=feedback_type, conversation_id=conversation_id, time_saved=time_saved, rating=rating, recommend=recommend, liked_aspects=liked_aspects, other_liked=other_liked, improvement_suggestions=improvement_suggestions, issues=issues, other_feedback=other_feedback)
@@ -9,17 +9,29 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from utils.config import config
 # from utils.s3_manager import S3Manager
 from core.document_processor import EnhancedDocumentProcessor
-from core.embeddings import EmbeddingManager
-from core.vector_store import VectorStore
+from core.embedding_pool import create_ingestion_embedder
+from core.vector_store import create_vector_store
 
 # Initialize session state
 if "uploaded_files" not in st.session_state:
     st.session_state.uploaded_files = []
 
+@st.cache_resource
+def get_embedding_manager():
+    """Create the ingestion embedder once per server, not on every script rerun."""
+    return create_ingestion_embedder()
+
+@st.cache_resource
+def get_vector_store():
+    """Open the vector store once per server; the local backend holds file handles."""
+    vector_store = create_vector_store()
+    vector_store.ensure_local_indexes()
+    return vector_store
+
 # Initialize components
-doc_processor = EnhancedDocumentProcessor()
-embedding_manager = EmbeddingManager()
-vector_store = VectorStore()
+embedding_manager = get_embedding_manager()
+doc_processor = EnhancedDocumentProcessor(embedding_manager)
+vector_store = get_vector_store()
 
 st.set_page_config(
     page_title=f"{config.APP_TITLE} - Document Upload",
@@ -59,12 +71,15 @@ if st.session_state.uploaded_files:
                 chunks = doc_processor.process_file(file_path)
                 
                 # Generate embeddings
-                embeddings = embedding_manager.generate_embeddings(
+                embeddings = embedding_manager.embed_documents(
                     [chunk['text'] for chunk in chunks]
                 )
                 
                 # Store in vector database
-                vector_store.add_documents(chunks, embeddings)
+                summary = vector_store.add_documents(chunks, embeddings)
+                if summary['failed']:
+                    st.warning(f"{summary['failed']} chunks from {file.name} failed to upload and were "
+                               f"saved to {summary['dead_letter_path']} for replay")
             
             st.success("Documents processed and indexed!")
             st.session_state.uploaded_files = []
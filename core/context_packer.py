@@ -0,0 +1,159 @@
+# core/context_packer.py
+import re
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from utils.config import config
+from utils.helpers import format_chat_history
+
+logger = logging.getLogger(__name__)
+
+# Shortest repeated span treated as chunk overlap rather than coincidence
+MIN_OVERLAP_CHARS = 50
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    """The model's tiktoken encoding, or None when tiktoken or its BPE files are unavailable."""
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"No tokenizer for {model}, estimating tokens from characters: {str(e)}")
+        return None
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    encoding = _encoding(model or config.LLM_MODEL)
+    if encoding is None:
+        # ~4 characters per token for English text
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """Cut text to at most max_tokens, backing off to the last whitespace so words stay whole."""
+    encoding = _encoding(model or config.LLM_MODEL)
+    if encoding is None:
+        truncated = text[:max_tokens * 4]
+    else:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        truncated = encoding.decode(tokens[:max_tokens])
+    cut = truncated.rfind(" ")
+    return truncated[:cut] if cut > len(truncated) // 2 else truncated
+
+def _normalize(text: str) -> str:
+    return re.sub(r'\s+', ' ', text).strip().casefold()
+
+def remove_overlap(text: str, kept: List[str]) -> Optional[str]:
+    """Strip the spans text shares with already-kept chunks.
+
+    Returns None when text is a duplicate of, or contained in, a kept chunk;
+    otherwise text without a leading span that ends a kept chunk or a
+    trailing span that starts one (the chunker's overlap).
+    """
+    normalized = _normalize(text)
+    for other in kept:
+        if normalized in _normalize(other):
+            return None
+    for other in kept:
+        # Leading overlap: text continues where the kept chunk ended
+        probe = text[:MIN_OVERLAP_CHARS]
+        start = other.find(probe) if len(probe) == MIN_OVERLAP_CHARS else -1
+        if start >= 0 and text.startswith(other[start:]):
+            text = text[len(other) - start:].lstrip()
+        # Trailing overlap: the kept chunk continues where text ends
+        probe = other[:MIN_OVERLAP_CHARS]
+        start = text.find(probe) if len(probe) == MIN_OVERLAP_CHARS else -1
+        if start >= 0 and other.startswith(text[start:]):
+            text = text[:start].rstrip()
+    return text or None
+
+def pack_history(chat_history: Optional[List[Dict]], budget: int) -> Dict[str, Any]:
+    """Keep the most recent messages whose formatted text fits the token budget.
+
+    A leading conversation summary (role "summary") stands in for everything
+    older, so it is kept ahead of the verbatim messages.
+    """
+    messages = list(chat_history or [])
+    pinned = [messages.pop(0)] if messages and messages[0]["role"] == "summary" else []
+    used = sum(count_tokens(format_chat_history([message])) + 1 for message in pinned)  # + joining newline
+    kept: List[Dict] = []
+    for message in reversed(messages):
+        tokens = count_tokens(format_chat_history([message])) + 1
+        if used + tokens > budget:
+            break
+        kept.insert(0, message)
+        used += tokens
+    kept = pinned + kept
+    return {
+        "chat_history": format_chat_history(kept) if kept else "",
+        "tokens": used,
+        "dropped": len(chat_history or []) - len(kept)
+    }
+
+def pack_context(
+    context: List[Dict],
+    chat_history: Optional[List[Dict]] = None,
+    context_budget: Optional[int] = None,
+    history_budget: Optional[int] = None
+) -> Dict[str, Any]:
+    """Assemble the prompt's context and history sections under token budgets.
+
+    Docs are taken in the given (best-first) order: duplicates and chunk
+    overlap are removed, then each doc is kept whole while it fits, the first
+    one that doesn't is trimmed to the remaining budget (if enough is left to
+    be useful), and the rest are dropped. Returns the formatted context and
+    history, the docs actually used, and token/drop counts.
+    """
+    context_budget = config.CONTEXT_TOKEN_BUDGET if context_budget is None else context_budget
+    history_budget = config.HISTORY_TOKEN_BUDGET if history_budget is None else history_budget
+
+    docs: List[Dict] = []
+    sections: List[str] = []
+    used = 0
+    duplicates = trimmed = dropped = 0
+    for doc in context:
+        if used >= context_budget:
+            dropped += 1
+            continue
+        text = remove_overlap(doc['text'], [kept['text'] for kept in docs])
+        if text is None:
+            duplicates += 1
+            continue
+
+        header = f"CONTEXT {len(docs) + 1}:\n"
+        # Sections are joined by a blank line
+        cost = count_tokens(f"{header}{text}\n") + (1 if sections else 0)
+        if used + cost > context_budget:
+            room = context_budget - used - count_tokens(header) - 2
+            if room < config.CONTEXT_MIN_CHUNK_TOKENS:
+                dropped += 1
+                continue
+            text = truncate_to_tokens(text, room)
+            cost = count_tokens(f"{header}{text}\n") + (1 if sections else 0)
+            trimmed += 1
+
+        docs.append({**doc, 'text': text})
+        sections.append(f"{header}{text}\n")
+        used += cost
+
+    history = pack_history(chat_history, history_budget)
+    return {
+        "context": "\n\n".join(sections),
+        "chat_history": history["chat_history"],
+        "docs": docs,
+        "stats": {
+            "context_tokens": used,
+            "history_tokens": history["tokens"],
+            "chunks_in": len(context),
+            "chunks_used": len(docs),
+            "chunks_trimmed": trimmed,
+            "chunks_dropped": dropped,
+            "duplicates_removed": duplicates,
+            "history_messages_dropped": history["dropped"]
+        }
+    }
@@ -0,0 +1,84 @@
+# core/doc_store.py
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+class DocumentStore:
+    """Local SQLite store of chunk text and full metadata, keyed by chunk_id.
+
+    The vector index only keeps ids and small filterable fields; search
+    results are hydrated from here in one batched lookup.
+    """
+
+    def __init__(self, db_path: Path):
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                parent_hash TEXT,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_parent_hash ON chunks (parent_hash)")
+        self._conn.commit()
+
+    def put_many(self, ids: List[str], texts: List[str], metadatas: List[Dict]):
+        """Insert or replace chunks; metadata is stored without the text."""
+        rows = [
+            (chunk_id, metadata.get('parent_hash'), text,
+             json.dumps({key: value for key, value in metadata.items() if key != 'text'}))
+            for chunk_id, text, metadata in zip(ids, texts, metadatas)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, parent_hash, text, metadata) VALUES (?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def get_many(self, ids: Iterable[str]) -> Dict[str, Tuple[str, Dict]]:
+        """Return {chunk_id: (text, metadata)} for the ids that are stored."""
+        ids = list(dict.fromkeys(ids))
+        found: Dict[str, Tuple[str, Dict]] = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                for chunk_id, text, metadata in self._conn.execute(
+                    f"SELECT id, text, metadata FROM chunks WHERE id IN ({placeholders})", batch
+                ):
+                    found[chunk_id] = (text, json.loads(metadata))
+        return found
+
+    def delete_by_parent_hash(self, parent_hashes: Iterable[str]) -> int:
+        parent_hashes = list(parent_hashes)
+        placeholders = ",".join("?" * len(parent_hashes))
+        with self._lock:
+            cursor = self._conn.execute(f"DELETE FROM chunks WHERE parent_hash IN ({placeholders})", parent_hashes)
+            self._conn.commit()
+            return cursor.rowcount
+
+    def disk_version(self) -> int:
+        """Changes whenever another connection (e.g. an ingestion run) commits to the database."""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -11,8 +11,6 @@ import os, sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from utils.config import config
 from utils.helpers import generate_document_id
-# from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_huggingface import HuggingFaceEmbeddings
 
 class DocumentContent:
     """Class to represent different types of content in a document."""
@@ -23,47 +21,48 @@ class DocumentContent:
         self.metadata = metadata or {}
 
 class SmartChunker:
-    """Handles intelligent chunking of different content types."""
-    def __init__(self, embeddings_model: str = config.EMBEDDING_MODEL):
-        try:
-            self.embedder = HuggingFaceEmbeddings(
-                model_name=embeddings_model,
-                model_kwargs={'device': 'cpu'},
-                encode_kwargs={'normalize_embeddings': True}
-            )
-        except Exception as e:
-            print(f"Error initializing embedder in SmartChunker: {str(e)}")
-            # Fallback to a simpler model
-            self.embedder = HuggingFaceEmbeddings(
-                model_name="sentence-transformers/all-mpnet-base-v2",
-                model_kwargs={'device': 'cpu'},
-                encode_kwargs={'normalize_embeddings': True}
-            )
-            
+    """Handles intelligent chunking of different content types.
+
+    Similarity merging embeds with the ingestion embedder, so the model is
+    loaded once and the chunk vectors land in the shared embedding cache.
+    """
+    def __init__(self, embedding_manager=None):
+        if embedding_manager is None:
+            from core.embedding_pool import create_ingestion_embedder
+            embedding_manager = create_ingestion_embedder()
+        self.embedder = embedding_manager
+
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=config.CHUNK_SIZE,
             chunk_overlap=config.CHUNK_OVERLAP,
             length_function=len,
         )
 
-    def _calculate_semantic_similarity(self, text1: str, text2: str) -> float:
-        """Calculate semantic similarity between two text chunks."""
-        emb1 = self.embedder.embed_documents([text1])[0]
-        emb2 = self.embedder.embed_documents([text2])[0]
-        return np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2))
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts in one call as a float32 (n, dim) array."""
+        return self.embedder.embed_documents(texts)
+
+    def _calculate_semantic_similarity(self, emb1: np.ndarray, emb2: np.ndarray) -> float:
+        """Calculate semantic similarity between two chunk embeddings."""
+        return float(np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2)))
 
     def _merge_similar_chunks(self, chunks: List[str], similarity_threshold: float = 0.8) -> List[str]:
         """Merge chunks that are semantically similar."""
         if not chunks:
             return chunks
 
+        # Embed every chunk in one batch; only a merged chunk needs re-embedding
+        embeddings = self._embed(chunks)
         merged_chunks = [chunks[0]]
-        for chunk in chunks[1:]:
-            similarity = self._calculate_semantic_similarity(merged_chunks[-1], chunk)
+        last_embedding = embeddings[0]
+        for chunk, embedding in zip(chunks[1:], embeddings[1:]):
+            similarity = self._calculate_semantic_similarity(last_embedding, embedding)
             if similarity > similarity_threshold:
                 merged_chunks[-1] = f"{merged_chunks[-1]} {chunk}"
+                last_embedding = self._embed([merged_chunks[-1]])[0]
             else:
                 merged_chunks.append(chunk)
+                last_embedding = embedding
         return merged_chunks
 
     def chunk_text(self, text: str) -> List[str]:
@@ -93,8 +92,8 @@ class SmartChunker:
 
 class EnhancedDocumentProcessor:
     """Enhanced document processor with smart chunking and content type handling."""
-    def __init__(self):
-        self.chunker = SmartChunker()
+    def __init__(self, embedding_manager=None):
+        self.chunker = SmartChunker(embedding_manager)
 
     def _extract_tables(self, pdf_path: Path) -> List[Dict]:
         """Extract tables from PDF with enhanced metadata."""
@@ -0,0 +1,102 @@
+# core/embedding_batcher.py
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from utils.config import config
+from utils.cache import normalize_query
+from utils.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+class QueryEmbeddingBatcher:
+    """Coalesces concurrent query embeddings into shared forward passes.
+
+    Queries that arrive within ``window_ms`` of the first waiting query (up to
+    ``max_batch_size``) are embedded together in one executor call, and each
+    caller's future is resolved with its own vector. Queries already in the
+    in-process query cache return immediately without queueing.
+    """
+
+    def __init__(self, embedding_manager, window_ms: Optional[float] = None,
+                 max_batch_size: Optional[int] = None):
+        self.embedding_manager = embedding_manager
+        self.window = (window_ms if window_ms is not None else config.QUERY_BATCH_WINDOW_MS) / 1000
+        self.max_batch_size = max_batch_size or config.QUERY_BATCH_MAX_SIZE
+        self.batch_size_histogram = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.queue_wait_histogram = Histogram([1, 2, 5, 10, 25, 50, 100, 250, 1000])  # milliseconds
+        # Created on first use, inside the serving event loop
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def _ensure_started(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def embed_query(self, text: str) -> np.ndarray:
+        """Embed one query, sharing the forward pass with concurrent callers."""
+        cached = self.embedding_manager.query_cache.get(normalize_query(text))
+        if cached is not None:
+            return cached
+
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future, time.perf_counter()))
+        return await future
+
+    async def _collect_batch(self) -> list:
+        """Wait for one query, then gather more until the window closes or the batch is full."""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            dispatched_at = time.perf_counter()
+            for _, _, enqueued_at in batch:
+                self.queue_wait_histogram.observe((dispatched_at - enqueued_at) * 1000)
+
+            # Identical concurrent questions share one slot in the batch
+            texts = list(dict.fromkeys(text for text, _, _ in batch))
+            self.batch_size_histogram.observe(len(texts))
+            try:
+                vectors = await loop.run_in_executor(
+                    None, self.embedding_manager.embed_uncached_queries, texts
+                )
+            except Exception as e:
+                logger.error(f"Batched query embedding failed: {str(e)}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            by_text = dict(zip(texts, vectors))
+            for text, future, _ in batch:
+                # The caller may have been cancelled (client disconnect) while waiting
+                if not future.done():
+                    future.set_result(by_text[text])
+
+    def stats(self) -> Dict:
+        """Batch-size and queue-wait histograms for the metrics endpoint."""
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch_size": self.max_batch_size,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "batch_size": self.batch_size_histogram.snapshot(),
+            "queue_wait_ms": self.queue_wait_histogram.snapshot()
+        }
@@ -0,0 +1,148 @@
+# core/embedding_benchmark.py
+import os
+import sys
+import time
+import argparse
+import logging
+from typing import List, Dict
+
+import numpy as np
+import PyPDF2
+
+# Add parent directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.embeddings import EmbeddingManager
+from utils.config import config
+from utils.helpers import truncate_embeddings
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+SAMPLE_QUERIES = [
+    "How do I add a new location in Cytric?",
+    "What is a trip purpose?",
+    "How to create a trip purpose rule",
+    "Where can I download the list of cytric locations?",
+    "How do I assign a division to a traveler?",
+    "Can trip purpose sets be administered per company?",
+    "Which fields are mandatory for a trip purpose definition?",
+    "How do I deactivate a division?",
+]
+
+def load_sample_texts(limit: int) -> List[str]:
+    """Cut the bundled PDFs into chunk-sized passages to benchmark on."""
+    texts = []
+    for pdf_path in sorted(config.DATA_DIR.glob("*.pdf")):
+        with open(pdf_path, 'rb') as file:
+            reader = PyPDF2.PdfReader(file)
+            for page in reader.pages:
+                page_text = (page.extract_text() or "").strip()
+                for i in range(0, len(page_text), config.CHUNK_SIZE):
+                    texts.append(page_text[i:i + config.CHUNK_SIZE])
+                    if len(texts) >= limit:
+                        return texts
+    return texts
+
+def cosine_agreement(reference: List[List[float]], candidate: List[List[float]]) -> Dict[str, float]:
+    """Row-wise cosine similarity between two sets of normalized embeddings."""
+    sims = np.sum(np.asarray(reference) * np.asarray(candidate), axis=1)
+    return {"mean": float(sims.mean()), "min": float(sims.min())}
+
+def query_latency(manager: EmbeddingManager, queries: List[str], repeat: int) -> Dict[str, float]:
+    """Per-query latency in milliseconds, bypassing the embedding cache."""
+    latencies = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            manager._encode([query], manager.query_prefix)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+def batch_throughput(manager: EmbeddingManager, texts: List[str]) -> Dict[str, float]:
+    """Document throughput for one bulk call, bypassing the embedding cache."""
+    start = time.perf_counter()
+    manager._encode(texts, manager.document_prefix)
+    elapsed = time.perf_counter() - start
+    return {
+        "texts_per_sec": len(texts) / elapsed,
+        "tokens_per_sec": manager.last_stats["tokens_per_sec"],
+    }
+
+def recall_at_k(reference_scores: np.ndarray, candidate_scores: np.ndarray, k: int) -> float:
+    """Fraction of the reference top-k neighbours that the candidate scores also rank in their top-k."""
+    k = min(k, reference_scores.shape[1])
+    reference_top = np.argsort(-reference_scores, axis=1)[:, :k]
+    candidate_top = np.argsort(-candidate_scores, axis=1)[:, :k]
+    overlap = [len(set(ref) & set(cand)) for ref, cand in zip(reference_top, candidate_top)]
+    return float(np.mean(overlap)) / k
+
+def matryoshka_report(texts: List[str], k: int):
+    """Print recall@k and bytes per vector for truncated dimensions and float16 storage."""
+    # Embed once at full width; every smaller variant is derived from these vectors
+    config.EMBEDDING_OUTPUT_DIMENSION = config.EMBEDDING_DIMENSION
+    config.VECTOR_TRANSPORT_DTYPE = "float32"
+    manager = EmbeddingManager()
+    documents = np.asarray(manager._encode(texts, manager.document_prefix), dtype=np.float32)
+    queries = np.asarray(manager._encode(SAMPLE_QUERIES + texts[:50], manager.query_prefix), dtype=np.float32)
+    reference_scores = queries @ documents.T
+
+    print(f"\n{'dimension':>10}{'dtype':>9}{'bytes/vec':>11}{f'recall@{k}':>11}")
+    for dimension in (config.EMBEDDING_DIMENSION, 768, 512, 256, 128):
+        if dimension > config.EMBEDDING_DIMENSION:
+            continue
+        for dtype in (np.float32, np.float16):
+            docs = truncate_embeddings(documents, dimension).astype(dtype).astype(np.float32)
+            qs = truncate_embeddings(queries, dimension).astype(dtype).astype(np.float32)
+            recall = recall_at_k(reference_scores, qs @ docs.T, k)
+            bytes_per_vector = dimension * np.dtype(dtype).itemsize
+            print(f"{dimension:>10}{np.dtype(dtype).name:>9}{bytes_per_vector:>11}{recall:>11.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding benchmarks: ONNX vs PyTorch, and Matryoshka recall vs vector size")
+    parser.add_argument("--report", choices=["backends", "matryoshka"], default="backends",
+                        help="backends: ONNX vs PyTorch parity and speed; matryoshka: recall vs vector size")
+    parser.add_argument("--quantize", action="store_true", help="Benchmark the int8-quantized ONNX model")
+    parser.add_argument("--limit", type=int, default=200, help="Number of document passages to embed")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions of the query latency loop")
+    parser.add_argument("--k", type=int, default=5, help="Neighbours compared in the recall report")
+    args = parser.parse_args()
+
+    config.EMBEDDING_ONNX_QUANTIZE = args.quantize
+    texts = load_sample_texts(args.limit)
+    logger.info(f"Loaded {len(texts)} sample passages from {config.DATA_DIR}")
+
+    if args.report == "matryoshka":
+        matryoshka_report(texts, args.k)
+        return
+
+    managers = {
+        "torch": EmbeddingManager(backend="torch"),
+        "onnx-int8" if args.quantize else "onnx": EmbeddingManager(backend="onnx"),
+    }
+
+    # Parity against the eager PyTorch output
+    reference = managers["torch"]._encode(texts + SAMPLE_QUERIES, "")
+    results = {}
+    for name, manager in managers.items():
+        candidate = manager._encode(texts + SAMPLE_QUERIES, "")
+        results[name] = {
+            **cosine_agreement(reference, candidate),
+            **query_latency(manager, SAMPLE_QUERIES, args.repeat),
+            **batch_throughput(manager, texts),
+        }
+
+    print(f"\n{'backend':<12}{'cos mean':>10}{'cos min':>10}{'p50 ms':>10}{'p95 ms':>10}{'texts/s':>10}{'tokens/s':>12}")
+    for name, row in results.items():
+        print(f"{name:<12}{row['mean']:>10.5f}{row['min']:>10.5f}{row['p50_ms']:>10.1f}"
+              f"{row['p95_ms']:>10.1f}{row['texts_per_sec']:>10.1f}{row['tokens_per_sec']:>12.0f}")
+
+if __name__ == "__main__":
+    main()
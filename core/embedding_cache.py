@@ -0,0 +1,120 @@
+# core/embedding_cache.py
+import hashlib
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.config import config
+
+logger = logging.getLogger(__name__)
+
+def cache_namespace(backend: Optional[str] = None) -> str:
+    """Cache key for the model plus any output-shaping settings that change its vectors."""
+    namespace = config.EMBEDDING_MODEL
+    # ONNX (and int8 ONNX above all) vectors differ slightly from the PyTorch ones
+    backend = backend or config.EMBEDDING_BACKEND
+    if backend != "torch":
+        namespace += f"+{backend}"
+        if backend == "onnx" and config.EMBEDDING_ONNX_QUANTIZE:
+            namespace += "-int8"
+    if config.EMBEDDING_OUTPUT_DIMENSION != config.EMBEDDING_DIMENSION:
+        namespace += f"@{config.EMBEDDING_OUTPUT_DIMENSION}"
+    if config.VECTOR_TRANSPORT_DTYPE == "float16":
+        namespace += ":float16"
+    # Inputs over the length cap are split or truncated, which changes their vectors
+    namespace += f":max{config.EMBEDDING_MAX_LENGTH}-{config.EMBEDDING_OVERLONG_STRATEGY}"
+    if config.EMBEDDING_OVERLONG_STRATEGY == "split":
+        namespace += f"-{config.EMBEDDING_WINDOW_OVERLAP}x{config.EMBEDDING_MAX_WINDOWS}"
+    return namespace
+
+class EmbeddingCache:
+    """Persistent content-addressed embedding cache backed by SQLite.
+
+    Vectors are keyed by (model name, prefix, sha256 of text) and stored as
+    raw float32 (or float16) blobs, so re-indexing unchanged content never
+    reaches the model.
+    """
+
+    def __init__(self, db_path: Path):
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                prefix TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, prefix, text_hash)
+            )"""
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        """Hash used as the content address of a text."""
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get_many(self, model: str, prefix: str, texts: List[str]) -> Dict[str, np.ndarray]:
+        """Return cached float32 vectors for the given texts, keyed by text."""
+        hashes = {self.text_hash(text): text for text in texts}
+        found: Dict[str, np.ndarray] = {}
+        hash_list = list(hashes)
+
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(hash_list), 500):
+                batch = hash_list[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, dim, vector FROM embeddings "
+                    f"WHERE model = ? AND prefix = ? AND text_hash IN ({placeholders})",
+                    [model, prefix, *batch]
+                ).fetchall()
+                for text_hash, dim, blob in rows:
+                    dtype = np.float16 if len(blob) == dim * 2 else np.float32
+                    found[hashes[text_hash]] = np.frombuffer(blob, dtype=dtype).astype(np.float32)
+        return found
+
+    def put_many(self, model: str, prefix: str, texts: List[str], vectors: np.ndarray):
+        """Store vectors for the given texts."""
+        dtype = np.float16 if config.VECTOR_TRANSPORT_DTYPE == "float16" else np.float32
+        rows = [
+            (model, prefix, self.text_hash(text), len(vector),
+             np.asarray(vector, dtype=dtype).tobytes())
+            for text, vector in zip(texts, vectors)
+        ]
+        try:
+            with self._lock:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, prefix, text_hash, dim, vector) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            # A cache write failure must never fail the embedding call itself
+            logger.error(f"Error writing embedding cache: {str(e)}")
+
+    def count(self, model: Optional[str] = None) -> int:
+        """Number of cached vectors, optionally for one model."""
+        with self._lock:
+            if model is None:
+                return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM embeddings WHERE model = ?", (model,)
+            ).fetchone()[0]
+
+    def close(self):
+        """Close the underlying SQLite connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,142 @@
+# core/embedding_pool.py
+import os
+import time
+import logging
+import multiprocessing as mp
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from utils.config import config
+from core.embedding_cache import EmbeddingCache, cache_namespace
+
+logger = logging.getLogger(__name__)
+
+# Per-process model instance, created once by the pool initializer
+_worker_manager = None
+
+def _init_worker(backend: Optional[str], num_threads: int):
+    """Load the model once per worker process with a pinned thread count."""
+    global _worker_manager
+    # Keep BLAS/OpenMP pools from oversubscribing the cores shared with other workers
+    os.environ["OMP_NUM_THREADS"] = str(num_threads)
+    os.environ["MKL_NUM_THREADS"] = str(num_threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    import torch
+    from core.embeddings import EmbeddingManager
+
+    torch.set_num_interop_threads(1)
+    _worker_manager = EmbeddingManager(backend=backend, num_threads=num_threads)
+
+def _embed_shard(args: Tuple[List[str], str]) -> Tuple[np.ndarray, Dict]:
+    """Embed one shard of texts inside a worker process."""
+    texts, prefix = args
+    vectors = _worker_manager._encode(texts, prefix)
+    return vectors, _worker_manager.last_stats
+
+class EmbeddingPool:
+    """Ingestion-mode embedder that shards chunk lists across worker processes.
+
+    Exposes the same embed_documents / last_stats surface as EmbeddingManager,
+    so ingestion scripts can use either one. Cache lookups and writes happen in
+    the parent; only uncached texts are sent to the workers.
+    """
+
+    def __init__(self, num_workers: Optional[int] = None, threads_per_worker: Optional[int] = None,
+                 backend: Optional[str] = None):
+        self.num_workers = num_workers or config.EMBEDDING_POOL_WORKERS or os.cpu_count() or 1
+        self.threads_per_worker = (
+            threads_per_worker
+            or config.EMBEDDING_POOL_THREADS_PER_WORKER
+            or max(1, (os.cpu_count() or 1) // self.num_workers)
+        )
+        self.backend = backend or config.EMBEDDING_BACKEND
+        self.document_prefix = config.EMBEDDING_DOCUMENT_PREFIX
+        self.cache = EmbeddingCache(config.EMBEDDING_CACHE_PATH) if config.EMBEDDING_CACHE_ENABLED else None
+        self.last_stats: Dict = {}
+
+        logger.info(f"Starting embedding pool: {self.num_workers} workers x {self.threads_per_worker} threads")
+        # spawn, not fork: torch thread pools do not survive a fork safely
+        self._pool = mp.get_context("spawn").Pool(
+            processes=self.num_workers,
+            initializer=_init_worker,
+            initargs=(backend, self.threads_per_worker)
+        )
+
+    def iter_documents(self, texts: List[str]) -> Iterator[np.ndarray]:
+        """Yield document embeddings in input order as worker shards complete."""
+        prefix = self.document_prefix
+        start_time = time.perf_counter()
+
+        cached = self.cache.get_many(cache_namespace(self.backend), prefix, texts) if self.cache else {}
+        missing = list(dict.fromkeys(text for text in texts if text not in cached))
+        shard_size = config.EMBEDDING_POOL_SHARD_SIZE
+        shards = [missing[i:i + shard_size] for i in range(0, len(missing), shard_size)]
+
+        total_tokens = 0
+        split_count = 0
+        truncated_count = 0
+        next_index = 0
+        results = self._pool.imap(_embed_shard, [(shard, prefix) for shard in shards])
+        for shard, (vectors, stats) in zip(shards, results):
+            total_tokens += stats.get('tokens', 0)
+            split_count += stats.get('split', 0)
+            truncated_count += stats.get('truncated', 0)
+            if self.cache:
+                self.cache.put_many(cache_namespace(self.backend), prefix, shard, vectors)
+            cached.update(zip(shard, vectors))
+
+            # Release everything now contiguous from the front of the input
+            while next_index < len(texts) and texts[next_index] in cached:
+                yield cached[texts[next_index]]
+                next_index += 1
+
+        while next_index < len(texts):
+            yield cached[texts[next_index]]
+            next_index += 1
+
+        elapsed = time.perf_counter() - start_time
+        self.last_stats = {
+            'texts': len(missing),
+            'batches': len(shards),
+            'tokens': total_tokens,
+            'seconds': elapsed,
+            'tokens_per_sec': total_tokens / elapsed if elapsed > 0 else 0.0,
+            'cache_hits': len(texts) - len(missing),
+            'split': split_count,
+            'truncated': truncated_count
+        }
+        if missing:
+            logger.info(
+                f"Pool embedded {len(missing)} texts in {len(shards)} shards: "
+                f"{total_tokens} tokens in {elapsed:.2f}s ({self.last_stats['tokens_per_sec']:.0f} tokens/sec)"
+            )
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """Generate embeddings for document chunks to be indexed, as a float32 (n, dim) array."""
+        embeddings = np.empty((len(texts), config.EMBEDDING_OUTPUT_DIMENSION), dtype=np.float32)
+        for i, embedding in enumerate(self.iter_documents(texts)):
+            embeddings[i] = embedding
+        return embeddings
+
+    def close(self):
+        """Shut down the worker processes."""
+        self._pool.close()
+        self._pool.join()
+        if self.cache:
+            self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def create_ingestion_embedder():
+    """Return an EmbeddingPool when EMBEDDING_POOL_WORKERS > 1, else an in-process EmbeddingManager."""
+    if config.EMBEDDING_POOL_WORKERS > 1:
+        return EmbeddingPool()
+
+    from core.embeddings import EmbeddingManager
+    return EmbeddingManager()
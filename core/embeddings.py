@@ -1,41 +1,261 @@
 # # core/embeddings.py
-from typing import List
+from typing import List, Dict, Optional, Tuple
+import time
+import logging
 import torch
-from transformers import AutoModel, AutoTokenizer
+from transformers import AutoConfig, AutoModel, AutoTokenizer
 import numpy as np
 from utils.config import config
+from utils.cache import TTLCache, normalize_query
+from utils.helpers import truncate_embeddings
+from core.embedding_cache import EmbeddingCache, cache_namespace
+
+logger = logging.getLogger(__name__)
 
 class EmbeddingManager:
-    def __init__(self):
-        print(f"Loading model from: {config.EMBEDDING_MODEL}")
-        # Load the model using transformers directly
+    def __init__(self, backend: Optional[str] = None, num_threads: Optional[int] = None):
+        self.backend = backend or config.EMBEDDING_BACKEND
+        print(f"Loading model from: {config.EMBEDDING_MODEL} (backend: {self.backend})")
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+        # Verify dimensions from the model config, before paying for the weights
+        model_dimension = AutoConfig.from_pretrained(config.EMBEDDING_MODEL).hidden_size
+        if model_dimension != config.EMBEDDING_DIMENSION:
+            raise ValueError(f"Model produces embeddings with dimension {model_dimension}, but config.EMBEDDING_DIMENSION is set to {config.EMBEDDING_DIMENSION}")
+        if not 0 < config.EMBEDDING_OUTPUT_DIMENSION <= model_dimension:
+            raise ValueError(f"config.EMBEDDING_OUTPUT_DIMENSION must be between 1 and {model_dimension}, got {config.EMBEDDING_OUTPUT_DIMENSION}")
+
         self.tokenizer = AutoTokenizer.from_pretrained(config.EMBEDDING_MODEL)
-        self.model = AutoModel.from_pretrained(config.EMBEDDING_MODEL, add_pooling_layer=False)
-        self.model.eval()
-        self.query_prefix = 'query: '
-        
-        # Verify dimensions
-        test_embedding = self.generate_embeddings(["Test dimension check"])
-        if test_embedding and len(test_embedding[0]) != config.EMBEDDING_DIMENSION:
-            raise ValueError(f"Model produces embeddings with dimension {len(test_embedding[0])}, but config.EMBEDDING_DIMENSION is set to {config.EMBEDDING_DIMENSION}")
-    
-    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for a list of texts."""
-        # Add query prefix for all texts (assuming they could be either documents or queries)
-        # In a production system, you might want to separate query and document embedding functions
-        texts_with_prefix = [f"{self.query_prefix}{text}" for text in texts]
-        
-        # Tokenize and generate embeddings
-        tokens = self.tokenizer(texts_with_prefix, padding=True, truncation=True, 
-                               return_tensors='pt', max_length=8192)
-        
-        with torch.no_grad():
-            outputs = self.model(**tokens)[0]
-            # Get CLS token embeddings (first token of each sequence)
-            embeddings = outputs[:, 0]
-            
-        # Normalize embeddings
-        embeddings = torch.nn.functional.normalize(embeddings, p=2, dim=1)
-        
-        # Convert to Python lists for compatibility with the rest of your code
-        return embeddings.tolist()
+        if self.backend == "onnx":
+            from core.onnx_backend import OnnxEmbeddingBackend
+            self.model = OnnxEmbeddingBackend(
+                config.EMBEDDING_MODEL,
+                config.EMBEDDING_ONNX_DIR,
+                quantize=config.EMBEDDING_ONNX_QUANTIZE,
+                num_threads=num_threads
+            )
+        elif self.backend == "torch":
+            # Load the model using transformers directly
+            self.model = AutoModel.from_pretrained(config.EMBEDDING_MODEL, add_pooling_layer=False)
+            self.model.eval()
+        else:
+            raise ValueError(f"Unknown embedding backend: {self.backend}")
+        self.query_prefix = config.EMBEDDING_QUERY_PREFIX
+        self.document_prefix = config.EMBEDDING_DOCUMENT_PREFIX
+        self.last_stats: Dict = {}
+        self.cache = EmbeddingCache(config.EMBEDDING_CACHE_PATH) if config.EMBEDDING_CACHE_ENABLED else None
+        self.query_cache = TTLCache(config.QUERY_EMBEDDING_CACHE_SIZE, config.QUERY_EMBEDDING_CACHE_TTL)
+
+    def warm_up(self):
+        """Run one uncached forward pass so the first real query does not pay for lazy allocations."""
+        start_time = time.perf_counter()
+        self._encode(["warm up"], self.query_prefix)
+        logger.info(f"Embedding model warm-up took {time.perf_counter() - start_time:.2f}s")
+
+    def close(self):
+        """Release the embedding cache connection."""
+        if self.cache:
+            self.cache.close()
+
+    def _make_batches(self, lengths: List[int]) -> List[List[int]]:
+        """Group input indices into length-sorted micro-batches under the token budget."""
+        # Longest first, so the peak-memory batch runs up front
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+
+        batches = []
+        current = []
+        for idx in order:
+            # Padded cost of a batch is its size times its longest (= first) sequence
+            longest = lengths[current[0]] if current else lengths[idx]
+            if current and (
+                (len(current) + 1) * longest > config.EMBEDDING_BATCH_TOKEN_BUDGET
+                or len(current) >= config.EMBEDDING_MAX_BATCH_SIZE
+            ):
+                batches.append(current)
+                current = []
+            current.append(idx)
+        if current:
+            batches.append(current)
+        return batches
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """Generate the embedding for a single search query."""
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        """Generate embeddings for search queries, reusing the in-process query cache."""
+        # Repeat questions skip both the on-disk cache and the model
+        results = [self.query_cache.get(normalize_query(text)) for text in texts]
+        missing = [text for text, embedding in zip(texts, results) if embedding is None]
+        if missing:
+            computed = dict(zip(missing, self.embed_uncached_queries(missing)))
+            results = [computed[text] if embedding is None else embedding
+                       for text, embedding in zip(texts, results)]
+        return np.stack(results) if results else self._empty()
+
+    def embed_uncached_queries(self, texts: List[str]) -> np.ndarray:
+        """Embed queries already known to miss the in-process cache, then remember them."""
+        embeddings = self._embed_cached(texts, self.query_prefix)
+        # Cached rows are shared between requests, so make them immutable
+        embeddings.setflags(write=False)
+        for text, embedding in zip(texts, embeddings):
+            self.query_cache.set(normalize_query(text), embedding)
+        return embeddings
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """Generate embeddings for document chunks to be indexed."""
+        return self._embed_cached(texts, self.document_prefix)
+
+    def generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Generate query-prefixed embeddings for a list of texts.
+
+        Kept for backward compatibility; prefer embed_query / embed_documents.
+        """
+        return self._embed_cached(texts, self.query_prefix)
+
+    def _empty(self) -> np.ndarray:
+        return np.empty((0, config.EMBEDDING_OUTPUT_DIMENSION), dtype=np.float32)
+
+    def _embed_cached(self, texts: List[str], prefix: str) -> np.ndarray:
+        """Embed texts, only running the model on texts missing from the cache."""
+        if self.cache is None:
+            return self._encode(texts, prefix)
+
+        cached = self.cache.get_many(cache_namespace(self.backend), prefix, texts)
+        # Deduplicate so repeated chunks are encoded once
+        missing = list(dict.fromkeys(text for text in texts if text not in cached))
+
+        vectors = self._encode(missing, prefix)
+        if missing:
+            self.cache.put_many(cache_namespace(self.backend), prefix, missing, vectors)
+            cached.update(zip(missing, vectors))
+
+        self.last_stats['cache_hits'] = len(texts) - len(missing)
+        results = np.empty((len(texts), config.EMBEDDING_OUTPUT_DIMENSION), dtype=np.float32)
+        for i, text in enumerate(texts):
+            results[i] = cached[text]
+        return results
+
+    def _postprocess(self, embeddings: np.ndarray) -> np.ndarray:
+        """Matryoshka truncation (a no-op at full dimension), L2 normalization and optional float16 rounding."""
+        embeddings = truncate_embeddings(embeddings, config.EMBEDDING_OUTPUT_DIMENSION)
+        if config.VECTOR_TRANSPORT_DTYPE == "float16":
+            embeddings = embeddings.astype(np.float16).astype(np.float32)
+        return embeddings
+
+    def _forward(self, features) -> np.ndarray:
+        """Run one padded batch through the backend and return normalized CLS embeddings."""
+        if self.backend == "onnx":
+            embeddings = self.model(features)
+        else:
+            with torch.no_grad():
+                outputs = self.model(**features)[0]
+                # Get CLS token embeddings (first token of each sequence)
+                embeddings = outputs[:, 0].numpy()
+
+        return self._postprocess(embeddings)
+
+    def _split_windows(self, input_ids: List[int]) -> Tuple[List[List[int]], bool]:
+        """Cut an overlong tokenized input into overlapping windows under EMBEDDING_MAX_LENGTH.
+
+        Returns the windows (with special tokens re-added) and whether any
+        tokens had to be dropped.
+        """
+        num_special = self.tokenizer.num_special_tokens_to_add()
+        content = input_ids[1:-1] if num_special == 2 else input_ids
+        window_size = max(1, config.EMBEDDING_MAX_LENGTH - num_special)
+
+        if config.EMBEDDING_OVERLONG_STRATEGY != "split":
+            return [self.tokenizer.build_inputs_with_special_tokens(content[:window_size])], True
+
+        step = max(1, window_size - config.EMBEDDING_WINDOW_OVERLAP)
+        starts = list(range(0, max(1, len(content) - config.EMBEDDING_WINDOW_OVERLAP), step))
+        truncated = len(starts) > config.EMBEDDING_MAX_WINDOWS
+        windows = [
+            self.tokenizer.build_inputs_with_special_tokens(content[start:start + window_size])
+            for start in starts[:config.EMBEDDING_MAX_WINDOWS]
+        ]
+        return windows, truncated
+
+    def _encode(self, texts: List[str], prefix: str) -> np.ndarray:
+        """Run the model over texts with the given prefix; returns a contiguous float32 (n, dim) array.
+
+        No forward sequence exceeds EMBEDDING_MAX_LENGTH tokens. Longer inputs are
+        split into windows whose embeddings are averaged by token count, or
+        truncated, depending on EMBEDDING_OVERLONG_STRATEGY.
+        """
+        if not texts:
+            self.last_stats = {'texts': 0, 'batches': 0, 'tokens': 0, 'padded_tokens': 0,
+                               'seconds': 0.0, 'tokens_per_sec': 0.0,
+                               'split': 0, 'truncated': 0, 'windows': 0}
+            return self._empty()
+
+        start_time = time.perf_counter()
+
+        texts_with_prefix = [f"{prefix}{text}" for text in texts]
+
+        # Tokenize without padding or truncation; each micro-batch is padded only to its own longest sequence
+        encoded = self.tokenizer(texts_with_prefix, truncation=False, verbose=False)
+
+        # Flatten inputs into forward sequences, remembering which input each came from
+        sequences: List[List[int]] = []
+        owners: List[int] = []
+        split_count = 0
+        truncated_count = 0
+        for i, input_ids in enumerate(encoded['input_ids']):
+            if len(input_ids) <= config.EMBEDDING_MAX_LENGTH:
+                windows = [input_ids]
+            else:
+                windows, truncated = self._split_windows(input_ids)
+                split_count += len(windows) > 1
+                truncated_count += truncated
+            sequences.extend(windows)
+            owners.extend([i] * len(windows))
+
+        lengths = [len(ids) for ids in sequences]
+        batches = self._make_batches(lengths)
+
+        window_embeddings = np.empty((len(sequences), config.EMBEDDING_OUTPUT_DIMENSION), dtype=np.float32)
+        for batch in batches:
+            features = self.tokenizer.pad(
+                [{'input_ids': sequences[i], 'attention_mask': [1] * lengths[i]} for i in batch],
+                return_tensors='np' if self.backend == "onnx" else 'pt'
+            )
+            # Scatter back to sequence order
+            window_embeddings[batch] = self._forward(features)
+
+        if len(sequences) == len(texts):
+            results = window_embeddings
+        else:
+            # Pool split inputs: token-weighted mean of their window embeddings, renormalized
+            weights = np.asarray(lengths, dtype=np.float32)[:, None]
+            pooled = np.zeros((len(texts), window_embeddings.shape[1]), dtype=np.float32)
+            np.add.at(pooled, owners, window_embeddings * weights)
+            results = self._postprocess(pooled)
+
+        elapsed = time.perf_counter() - start_time
+        total_tokens = sum(lengths)
+        self.last_stats = {
+            'texts': len(texts),
+            'batches': len(batches),
+            'tokens': total_tokens,
+            'padded_tokens': sum(len(batch) * lengths[batch[0]] for batch in batches),
+            'seconds': elapsed,
+            'tokens_per_sec': total_tokens / elapsed if elapsed > 0 else 0.0,
+            'split': split_count,
+            'truncated': truncated_count,
+            'windows': len(sequences)
+        }
+        if len(texts) > 1:
+            logger.info(
+                f"Embedded {len(texts)} texts in {len(batches)} batches: "
+                f"{total_tokens} tokens in {elapsed:.2f}s ({self.last_stats['tokens_per_sec']:.0f} tokens/sec)"
+            )
+        if split_count or truncated_count:
+            logger.info(
+                f"Overlong inputs: {split_count} split into {len(sequences) - len(texts) + split_count} windows, "
+                f"{truncated_count} truncated at {config.EMBEDDING_MAX_LENGTH} tokens per window"
+            )
+
+        return results
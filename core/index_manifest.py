@@ -0,0 +1,137 @@
+# core/index_manifest.py
+import time
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Set
+
+logger = logging.getLogger(__name__)
+
+class IndexManifest:
+    """Persistent record of what is in the vector index: section -> content hash -> chunk ids.
+
+    Updated after every successful upsert and delete, so change detection and
+    deletes are answered locally instead of by scanning the index. Each chunk
+    also records the namespace it was written to, so deletes go straight to
+    the right partition.
+    """
+
+    def __init__(self, db_path: Path):
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY,
+                section TEXT,
+                parent_hash TEXT,
+                indexed_at REAL NOT NULL,
+                namespace TEXT NOT NULL DEFAULT ''
+            )"""
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")]
+        if "namespace" not in columns:
+            self._conn.execute("ALTER TABLE chunks ADD COLUMN namespace TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_section ON chunks (section)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_parent_hash ON chunks (parent_hash)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+
+    def record(self, ids: List[str], metadatas: List[Dict], namespace: str = ""):
+        """Register chunks that were just written to the index."""
+        now = time.time()
+        rows = [(chunk_id, metadata.get('section'), metadata.get('parent_hash'), now, namespace)
+                for chunk_id, metadata in zip(ids, metadatas)]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_id, section, parent_hash, indexed_at, namespace) "
+                "VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE chunk_id = ?", [(chunk_id,) for chunk_id in ids])
+            self._conn.commit()
+
+    def section_hashes(self) -> Dict[str, str]:
+        """Map each section to the content hash it was most recently indexed with."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT section, parent_hash FROM chunks "
+                "WHERE section IS NOT NULL AND parent_hash IS NOT NULL "
+                "GROUP BY section, parent_hash ORDER BY MAX(indexed_at)"
+            ).fetchall()
+        # Later rows win, leaving the newest hash per section
+        return {section: parent_hash for section, parent_hash in rows}
+
+    def ids_for_parent_hashes(self, parent_hashes: Iterable[str]) -> Dict[str, List[str]]:
+        """Chunk ids of the given parent documents, grouped by namespace."""
+        parent_hashes = list(parent_hashes)
+        placeholders = ",".join("?" * len(parent_hashes))
+        ids_by_namespace: Dict[str, List[str]] = {}
+        with self._lock:
+            for chunk_id, namespace in self._conn.execute(
+                f"SELECT chunk_id, namespace FROM chunks WHERE parent_hash IN ({placeholders})", parent_hashes
+            ):
+                ids_by_namespace.setdefault(namespace, []).append(chunk_id)
+        return ids_by_namespace
+
+    def recorded_namespaces(self, ids: Iterable[str]) -> Dict[str, str]:
+        """Map each recorded chunk id to the namespace it was last written to."""
+        ids = list(ids)
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            return dict(self._conn.execute(
+                f"SELECT chunk_id, namespace FROM chunks WHERE chunk_id IN ({placeholders})", ids
+            ))
+
+    def known_parent_hashes(self, parent_hashes: Iterable[str]) -> Set[str]:
+        """The subset of parent_hashes that has chunks recorded in the manifest."""
+        parent_hashes = list(parent_hashes)
+        placeholders = ",".join("?" * len(parent_hashes))
+        with self._lock:
+            return {row[0] for row in self._conn.execute(
+                f"SELECT DISTINCT parent_hash FROM chunks WHERE parent_hash IN ({placeholders})", parent_hashes
+            )}
+
+    def superseded_hashes(self, section: str, current_hash: str) -> List[str]:
+        """Content hashes still indexed for a section other than its current one."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT parent_hash FROM chunks WHERE section = ? AND parent_hash IS NOT NULL AND parent_hash != ?",
+                (section, current_hash)
+            )]
+
+    def disk_version(self) -> int:
+        """Changes whenever another connection (e.g. an ingestion run) commits to the database."""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def is_backfilled(self) -> bool:
+        """Whether the manifest was rebuilt from the index, so it covers chunks written before it existed."""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM meta WHERE key = 'backfilled'").fetchone() is not None
+
+    def mark_backfilled(self):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('backfilled', ?)", (str(time.time()),))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM meta WHERE key = 'backfilled'")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -9,8 +9,8 @@ from typing import Dict, List
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from core.web_scraper import IndigoWebScraper
-from core.embeddings import EmbeddingManager
-from core.vector_store import VectorStore
+from core.embedding_pool import create_ingestion_embedder
+from core.vector_store import create_vector_store
 from utils.config import config
 
 # Set up logging
@@ -26,8 +26,11 @@ def main():
     
     # Initialize components
     scraper = IndigoWebScraper()
-    embedding_manager = EmbeddingManager()
-    vector_store = VectorStore()
+    embedding_manager = create_ingestion_embedder()
+    vector_store = create_vector_store()
+
+    # Backfill the manifest, doc store and lexical index from chunks indexed before they existed
+    vector_store.ensure_local_indexes()
     
     # Get existing content hashes to detect changes
     existing_hashes = vector_store.get_existing_hashes()
@@ -48,18 +51,32 @@ def main():
         
         # Generate embeddings only for changed content
         logger.info("Generating embeddings for changed content...")
-        embeddings = embedding_manager.generate_embeddings(
+        embeddings = embedding_manager.embed_documents(
             [chunk['text'] for chunk in all_chunks]
         )
+        stats = embedding_manager.last_stats
+        logger.info(f"Embedding throughput: {stats['tokens_per_sec']:.0f} tokens/sec "
+                    f"({stats['tokens']} tokens, {stats['batches']} batches, "
+                    f"{stats.get('cache_hits', 0)} chunks served from cache, "
+                    f"{stats.get('split', 0)} split, {stats.get('truncated', 0)} truncated)")
         
         # Upload to vector database
         logger.info("Uploading to vector database...")
-        vector_store.add_documents(all_chunks, embeddings)
+        summary = vector_store.add_documents(all_chunks, embeddings)
         
-        logger.info(f"Successfully indexed {len(all_chunks)} new/updated chunks")
+        logger.info(f"Successfully indexed {summary['upserted']} of {len(all_chunks)} new/updated chunks")
+        if summary['failed']:
+            logger.error(f"{summary['failed']} chunks failed to upload; replay them from {summary['dead_letter_path']}")
+        else:
+            # Updated sections were re-chunked under a new hash; drop the old version's chunks
+            changed_sections = {chunk['metadata']['section']: chunk['metadata']['parent_hash'] for chunk in all_chunks}
+            superseded_count = vector_store.delete_superseded_versions(changed_sections)
+            if superseded_count:
+                logger.info(f"Deleted {superseded_count} vectors from superseded versions of updated sections")
     else:
         logger.info("No content changes detected - nothing to update")
     
+    embedding_manager.close()
     logger.info("Website content indexing completed")
 
 if __name__ == "__main__":
@@ -0,0 +1,175 @@
+# core/lexical_index.py
+import re
+import json
+import math
+import heapq
+import logging
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Only the most frequent function words; BM25's idf already discounts the rest
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it of on or "
+    "the this to what when where which who why with you your".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords; codes like TP-01 become ['tp', '01']."""
+    return [token for token in re.findall(r'\w+', text.casefold()) if token not in STOPWORDS]
+
+class LexicalIndex:
+    """Incrementally maintained BM25 inverted index over chunk text.
+
+    Term frequencies and the chunks' index metadata are persisted in SQLite
+    so the postings can be rebuilt in memory at startup; a search notices commits
+    made by another process (an ingestion run) and reloads before scoring.
+    """
+
+    def __init__(self, db_path: Path, k1: float = 1.2, b: float = 0.75):
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS documents (
+                id TEXT PRIMARY KEY,
+                parent_hash TEXT,
+                length INTEGER NOT NULL,
+                terms TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS documents_parent_hash ON documents (parent_hash)")
+        self._conn.commit()
+        self._load()
+
+    def _data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _load(self):
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._doc_terms: Dict[str, List[str]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._metadata: Dict[str, Dict] = {}
+        self._total_length = 0
+        for doc_id, length, terms, metadata in self._conn.execute(
+            "SELECT id, length, terms, metadata FROM documents"
+        ):
+            self._index(doc_id, length, json.loads(terms), json.loads(metadata))
+        self._version = self._data_version()
+
+    def _index(self, doc_id: str, length: int, terms: Dict[str, int], metadata: Dict):
+        for term, tf in terms.items():
+            self._postings[term][doc_id] = tf
+        self._doc_terms[doc_id] = list(terms)
+        self._lengths[doc_id] = length
+        self._metadata[doc_id] = metadata
+        self._total_length += length
+
+    def _unindex(self, doc_id: str):
+        length = self._lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self._total_length -= length
+        del self._metadata[doc_id]
+        for term in self._doc_terms.pop(doc_id):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def _refresh_if_stale(self):
+        if self._data_version() != self._version:
+            logger.info(f"Lexical index changed on disk, reloading {self.db_path}")
+            self._load()
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Dict]):
+        """Index (or re-index) chunk texts; metadatas are returned with search hits."""
+        rows = []
+        with self._lock:
+            self._refresh_if_stale()
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                tokens = tokenize(text)
+                terms = dict(Counter(tokens))
+                self._unindex(doc_id)
+                self._index(doc_id, len(tokens), terms, metadata)
+                rows.append((doc_id, metadata.get('parent_hash'), len(tokens), json.dumps(terms), json.dumps(metadata)))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (id, parent_hash, length, terms, metadata) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+            self._version = self._data_version()
+
+    def delete_by_parent_hash(self, parent_hashes: Iterable[str]) -> int:
+        """Remove every chunk of the given parent documents."""
+        parent_hashes = list(parent_hashes)
+        with self._lock:
+            self._refresh_if_stale()
+            placeholders = ",".join("?" * len(parent_hashes))
+            doc_ids = [row[0] for row in self._conn.execute(
+                f"SELECT id FROM documents WHERE parent_hash IN ({placeholders})", parent_hashes
+            )]
+            for doc_id in doc_ids:
+                self._unindex(doc_id)
+            self._conn.executemany("DELETE FROM documents WHERE id = ?", [(doc_id,) for doc_id in doc_ids])
+            self._conn.commit()
+            self._version = self._data_version()
+            return len(doc_ids)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM documents")
+            self._conn.commit()
+            self._load()
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float, Dict]]:
+        """Return (id, BM25 score, metadata) for the k best-scoring chunks."""
+        with self._lock:
+            self._refresh_if_stale()
+            n_docs = len(self._lengths)
+            if not n_docs:
+                return []
+            avg_length = self._total_length / n_docs or 1.0
+            scores: Dict[str, float] = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [(doc_id, score, self._metadata[doc_id]) for doc_id, score in best]
+
+    def disk_version(self) -> int:
+        """Changes whenever another connection (e.g. an ingestion run) commits to the index."""
+        with self._lock:
+            return self._data_version()
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._lengths)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int, rrf_k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists with RRF: score(d) = sum over lists of 1 / (rrf_k + rank)."""
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (rrf_k + rank)
+    return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
@@ -1,5 +1,9 @@
 # core/llm.py
 
+import time
+import asyncio
+import hashlib
+import logging
 from typing import List, Dict, Optional, Tuple, Any
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
@@ -8,6 +12,9 @@ from langchain_core.runnables import RunnablePassthrough
 from langchain.callbacks.base import BaseCallbackHandler
 from utils.config import config
 from utils.helpers import format_chat_history
+from utils.metrics import Histogram
+from utils.cache import TTLCache, normalize_query
+from core.context_packer import pack_context
 import json
 import re
 from urllib.parse import urlparse
@@ -16,6 +23,19 @@ from .track import langsmith_integration
 # LangSmith Integration.
 langsmith_integration()
 
+logger = logging.getLogger(__name__)
+
+# blocking: an LLM check runs before generation; heuristic: a cheap local check; off: no
+# check. A question the check flags is answered with clarifying questions instead.
+CLARIFICATION_MODES = ("blocking", "heuristic", "off")
+
+# Follow-ups that lean on earlier turns, e.g. "what about it?"
+VAGUE_REFERENCE = re.compile(r"^\s*(it|that|this|these|those|they|them|which one|what about)\b", re.IGNORECASE)
+
+def strip_references(text: str) -> str:
+    """Drop the References block appended to answers by format_source_references."""
+    return text.split("**References:**")[0].rstrip()
+
 class StreamHandler(BaseCallbackHandler):
     def __init__(self, container):
         self.container = container
@@ -35,8 +55,30 @@ class APITokenStreamHandler(BaseCallbackHandler):
         self.buffer = ""
         return out
 
-class LLMManager:
+class FirstTokenTimer(BaseCallbackHandler):
+    """Records when the first non-empty token arrives."""
     def __init__(self):
+        self.first_token_at: Optional[float] = None
+    def on_llm_new_token(self, token: str, **kwargs):
+        if self.first_token_at is None and token:
+            self.first_token_at = time.perf_counter()
+
+class LLMManager:
+    def __init__(self, clarification_mode: Optional[str] = None):
+        self.clarification_mode = clarification_mode or config.CLARIFICATION_MODE
+        if self.clarification_mode not in CLARIFICATION_MODES:
+            raise ValueError(f"Unknown clarification mode {self.clarification_mode!r}; expected one of {CLARIFICATION_MODES}")
+        # Time to first token in milliseconds, from the start of a generate/stream call
+        self.ttft_histograms = {
+            mode: Histogram([100, 250, 500, 750, 1000, 1500, 2000, 3000, 5000, 10000])
+            for mode in CLARIFICATION_MODES
+        }
+        self.prompt_token_histogram = Histogram([250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000])
+        # Final answers (with references) by question, retrieved chunks and history
+        self.answer_cache = (
+            TTLCache(config.ANSWER_CACHE_SIZE, config.ANSWER_CACHE_TTL) if config.ANSWER_CACHE_ENABLED else None
+        )
+
         self.llm = ChatOpenAI(
             model=config.LLM_MODEL,
             temperature=0.7,
@@ -77,6 +119,8 @@ class LLMManager:
             ("system", self.system_prompt),
             ("human", self.human_prompt)
         ])
+        # Built once: the client's HTTP connection pool is shared by every async stream
+        self.stream_chain = self.prompt | self.llm | StrOutputParser()
         
         # Non-streaming LLM for clarification assessment
         self.analysis_llm = ChatOpenAI(
@@ -120,7 +164,38 @@ class LLMManager:
             | self.analysis_llm
             | StrOutputParser()
         )
+
+        self.summary_system_prompt = """You maintain a running summary of a support conversation about the Cytric Travel Management System.
+
+        Update the existing summary with the new messages. Keep what the user told us about themselves and their setup,
+        the questions they asked, and the gist of each answer, including which options or settings it pointed to.
+        Leave out step-by-step instructions, links and pleasantries. Write at most {max_words} words of plain prose
+        and return only the updated summary.
+
+        Existing summary:
+        {summary}
+
+        New messages:
+        {messages}
+        """
+
+        self.summary_chain = (
+            ChatPromptTemplate.from_messages([("system", self.summary_system_prompt)])
+            | self.analysis_llm
+            | StrOutputParser()
+        )
     
+    def summarize_conversation(self, summary: str, messages: List[Dict]) -> str:
+        """Fold messages into a conversation's rolling summary (blocking LLM call)."""
+        return self.summary_chain.invoke({
+            "summary": summary or "(none yet)",
+            "messages": format_chat_history([
+                {"role": message["role"], "content": strip_references(message["content"])}
+                for message in messages
+            ]),
+            "max_words": config.CONVERSATION_SUMMARY_MAX_WORDS
+        }).strip()
+
     def extract_source_links(self, context_docs: List[Dict]) -> List[str]:
         """Extract unique source URLs from context documents."""
         sources = []
@@ -158,6 +233,127 @@ class LLMManager:
             # If any error occurs, default to not needing clarification
             print(f"Error in clarification assessment: {str(e)}")
             return False, []
+
+    def heuristic_needs_clarification(
+        self,
+        question: str,
+        context: List[Dict],
+        chat_history: Optional[List[Dict]] = None
+    ) -> Tuple[bool, List[str]]:
+        """Local stand-in for needs_clarification: flags questions too short or too
+        referential to answer on their own, and questions with no retrieved context."""
+        if not context:
+            return True, ["Could you describe in more detail what you would like to know about Cytric?"]
+        if chat_history:
+            return False, []
+        if len(re.findall(r"\w+", question)) < 3 or VAGUE_REFERENCE.match(question):
+            return True, ["Could you tell me which Cytric feature or process you are asking about?"]
+        return False, []
+
+    def _check_clarification(
+        self,
+        question: str,
+        context: List[Dict],
+        chat_history: Optional[List[Dict]]
+    ) -> Optional[str]:
+        """Run the clarification check according to the mode; returns the message asking
+        the user to clarify, or None when the question can be answered."""
+        if self.clarification_mode == "off":
+            return None
+        if self.clarification_mode == "heuristic":
+            needs_clarification, questions = self.heuristic_needs_clarification(question, context, chat_history)
+        else:
+            needs_clarification, questions = self.needs_clarification(question, context, chat_history)
+        if not (needs_clarification and questions):
+            return None
+        logger.info(f"Asking for clarification of {question!r}: {questions}")
+        return self._format_clarification_question(questions)
+
+    async def _acheck_clarification(
+        self,
+        question: str,
+        context: List[Dict],
+        chat_history: Optional[List[Dict]]
+    ) -> Optional[str]:
+        """_check_clarification for the event loop: a blocking check is awaited, not run inline."""
+        if self.clarification_mode != "blocking":
+            return self._check_clarification(question, context, chat_history)
+        return await asyncio.to_thread(self._check_clarification, question, context, chat_history)
+
+    @staticmethod
+    def _format_clarification_question(questions: List[str]) -> str:
+        if len(questions) == 1:
+            return questions[0]
+        return "To give you an accurate answer, could you clarify:\n" + "\n".join(f"- {q}" for q in questions)
+
+    def _answer_cache_key(
+        self,
+        question: str,
+        context: List[Dict],
+        chat_history: Optional[List[Dict]]
+    ) -> Optional[Tuple]:
+        """(normalized question, sorted chunk ids, digest of the chunks, digest of the history).
+
+        Chunk ids are content hashes, so re-indexed content retrieves new ids and
+        misses; the text digest covers chunks indexed without an id.
+        """
+        if self.answer_cache is None:
+            return None
+        chunks = sorted((doc.get('metadata', {}).get('chunk_id') or "", doc['text']) for doc in context)
+        chunk_digest = hashlib.blake2b(digest_size=16)
+        for chunk_id, text in chunks:
+            chunk_digest.update(f"{chunk_id}\0{text}\0".encode("utf-8"))
+        history = normalize_query(format_chat_history(chat_history)) if chat_history else ""
+        history_digest = hashlib.blake2b(history.encode("utf-8"), digest_size=16).hexdigest()
+        return (
+            normalize_query(question),
+            tuple(chunk_id for chunk_id, _ in chunks),
+            chunk_digest.hexdigest(),
+            history_digest
+        )
+
+    def _cached_answer(self, key: Optional[Tuple]) -> Optional[str]:
+        return self.answer_cache.get(key) if key is not None else None
+
+    def _cache_answer(self, key: Optional[Tuple], response: str):
+        if key is not None and response.strip():
+            self.answer_cache.set(key, response)
+
+    @staticmethod
+    def _replay(response: str) -> List[str]:
+        """Split a cached answer into word-sized chunks so it streams like a live one."""
+        return re.findall(r"\s*\S+|\s+$", response)
+
+    def answer_cache_stats(self) -> Optional[Dict[str, Any]]:
+        return self.answer_cache.stats() if self.answer_cache is not None else None
+
+    def _record_ttft(self, start_time: float, timer: FirstTokenTimer):
+        if timer.first_token_at is not None:
+            self.ttft_histograms[self.clarification_mode].observe((timer.first_token_at - start_time) * 1000)
+
+    def _pack_prompt(self, context: List[Dict], chat_history: Optional[List[Dict]]) -> Dict[str, Any]:
+        """pack_context under the configured budgets, recording the resulting token counts."""
+        packed = pack_context(context, chat_history)
+        stats = packed["stats"]
+        self.prompt_token_histogram.observe(stats["context_tokens"] + stats["history_tokens"])
+        logger.info(
+            f"Prompt context: {stats['context_tokens']} tokens from {stats['chunks_used']}/{stats['chunks_in']} chunks "
+            f"({stats['chunks_trimmed']} trimmed, {stats['chunks_dropped']} dropped, "
+            f"{stats['duplicates_removed']} duplicates), history: {stats['history_tokens']} tokens"
+        )
+        return packed
+
+    def prompt_token_stats(self) -> Dict[str, Any]:
+        """Histogram of context + history tokens sent per prompt."""
+        return self.prompt_token_histogram.snapshot()
+
+    def ttft_stats(self) -> Dict[str, Any]:
+        """Time-to-first-token histograms (ms) for each clarification mode that has served requests."""
+        snapshots = {mode: histogram.snapshot() for mode, histogram in self.ttft_histograms.items()}
+        return {
+            "clarification_mode": self.clarification_mode,
+            "modes": {mode: snapshot for mode, snapshot in snapshots.items() if snapshot["count"]}
+        }
     
     def _extract_anchor_text(self, text: str, url: str) -> str:
         """Extract relevant anchor text for a URL from the content."""
@@ -201,21 +397,29 @@ class LLMManager:
         streaming_container = None
     ) -> str:
         """Generate a comprehensive response with proper source attribution."""
+        cache_key = self._answer_cache_key(question, context, chat_history)
+        cached = self._cached_answer(cache_key)
+        if cached is not None:
+            if streaming_container:
+                streaming_container.markdown(cached)
+            return cached
+
+        start_time = time.perf_counter()
+        timer = FirstTokenTimer()
+        # Fit context and history to their token budgets; only the docs used are cited
+        packed = self._pack_prompt(context, chat_history)
+        context = packed["docs"]
         # Check for clarification needs
-        needs_clarification, clarifying_questions = self.needs_clarification(
-            question, context, chat_history
-        )
-        
-        # if needs_clarification and clarifying_questions:
-        #     return self._format_clarification_question(clarifying_questions)
+        clarification = self._check_clarification(question, context, chat_history)
+        if clarification:
+            if streaming_container:
+                streaming_container.markdown(clarification)
+            return clarification
         
         # Generate the main response
-        formatted_context = "\n\n".join([
-            f"CONTEXT {i+1}:\n{doc['text']}\n" 
-            for i, doc in enumerate(context)
-        ])
+        formatted_context = packed["context"]
         
-        formatted_history = format_chat_history(chat_history) if chat_history else ""
+        formatted_history = packed["chat_history"]
         
         # If streaming is requested, use a streaming handler
         if streaming_container:
@@ -241,7 +445,7 @@ class LLMManager:
                 "context": formatted_context,
                 "chat_history": formatted_history,
                 "question": question
-            })
+            }, config={"callbacks": [timer]})
             
             # Use the accumulated text from the stream handler
             response = stream_handler.text
@@ -257,7 +461,8 @@ class LLMManager:
                 "context": formatted_context,
                 "chat_history": formatted_history,
                 "question": question
-            })
+            }, config={"callbacks": [timer]})
+        self._record_ttft(start_time, timer)
         
         # Add formatted source references
         if not response.strip().endswith(("?", "...")):
@@ -265,6 +470,7 @@ class LLMManager:
             if source_references:
                 response += f"\n\n{source_references}"
         
+        self._cache_answer(cache_key, response)
         return response
 
     def stream_response(
@@ -274,14 +480,23 @@ class LLMManager:
         chat_history: Optional[List[Dict]] = None
     ):
         """Yield tokens as they are generated by the LLM (for API streaming)."""
-        needs_clarification, clarifying_questions = self.needs_clarification(
-            question, context, chat_history
-        )
-        formatted_context = "\n\n".join([
-            f"CONTEXT {i+1}:\n{doc['text']}\n" 
-            for i, doc in enumerate(context)
-        ])
-        formatted_history = format_chat_history(chat_history) if chat_history else ""
+        cache_key = self._answer_cache_key(question, context, chat_history)
+        cached = self._cached_answer(cache_key)
+        if cached is not None:
+            yield from self._replay(cached)
+            return
+
+        start_time = time.perf_counter()
+        timer = FirstTokenTimer()
+        packed = self._pack_prompt(context, chat_history)
+        context = packed["docs"]
+        clarification = self._check_clarification(question, context, chat_history)
+        if clarification:
+            yield clarification
+            return
+        response = ""
+        formatted_context = packed["context"]
+        formatted_history = packed["chat_history"]
         stream_handler = APITokenStreamHandler()
         streaming_llm = ChatOpenAI(
             model=config.LLM_MODEL,
@@ -299,11 +514,55 @@ class LLMManager:
             "context": formatted_context,
             "chat_history": formatted_history,
             "question": question
-        }):
+        }, config={"callbacks": [timer]}):
             chunk = stream_handler.get_and_clear()
             if chunk:
+                response += chunk
                 yield chunk
+        self._record_ttft(start_time, timer)
         # Add formatted source references at the end
         source_references = self.format_source_references(context)
         if source_references:
-            yield f"\n\n{source_references}"
\ No newline at end of file
+            response += f"\n\n{source_references}"
+            yield f"\n\n{source_references}"
+        # Only a stream that ran to completion is cached
+        self._cache_answer(cache_key, response)
+
+    async def astream_response(
+        self,
+        question: str,
+        context: List[Dict],
+        chat_history: Optional[List[Dict]] = None
+    ):
+        """Async variant of stream_response on the shared client; tokens come straight from astream,
+        so a stream holds no worker thread while it waits on the model."""
+        cache_key = self._answer_cache_key(question, context, chat_history)
+        cached = self._cached_answer(cache_key)
+        if cached is not None:
+            for chunk in self._replay(cached):
+                yield chunk
+            return
+
+        start_time = time.perf_counter()
+        timer = FirstTokenTimer()
+        packed = self._pack_prompt(context, chat_history)
+        context = packed["docs"]
+        clarification = await self._acheck_clarification(question, context, chat_history)
+        if clarification:
+            yield clarification
+            return
+        response = ""
+        async for chunk in self.stream_chain.astream({
+            "context": packed["context"],
+            "chat_history": packed["chat_history"],
+            "question": question
+        }, config={"callbacks": [timer]}):
+            if chunk:
+                response += chunk
+                yield chunk
+        self._record_ttft(start_time, timer)
+        source_references = self.format_source_references(context)
+        if source_references:
+            response += f"\n\n{source_references}"
+            yield f"\n\n{source_references}"
+        self._cache_answer(cache_key, response)
@@ -0,0 +1,319 @@
+# core/local_vector_store.py
+import os
+import json
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from utils.config import config
+from core.vector_store import BaseVectorStore
+from core.metadata_filter import matches_filter
+
+try:
+    import faiss
+except ImportError:  # NumPy brute force is fast enough for small corpora
+    faiss = None
+
+class LocalPartition:
+    """One namespace of the local vector store, persisted in its own directory.
+
+    Vectors live in a memory-mapped float32 .npy file, one row per record;
+    ids and metadata live in a SQLite table keyed by that row. Search is exact
+    inner product (cosine, since embeddings are normalized), through a FAISS
+    flat index when faiss is installed and NumPy otherwise. Rows freed by
+    deletes are reused by later inserts.
+
+    Several processes (the API and the ingestion scripts) can share a
+    partition: every operation first checks metadata.db's data_version and
+    reloads when another connection has committed, and writes claim rows
+    inside an immediate transaction so concurrent writers never pick the
+    same free row.
+    """
+
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self, directory: Path):
+        self.logger = logging.getLogger(__name__)
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dimension = config.EMBEDDING_OUTPUT_DIMENSION
+        self.vectors_path = self.directory / "vectors.npy"
+        self._lock = threading.RLock()
+
+        self._conn = sqlite3.connect(str(self.directory / "metadata.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            "row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, metadata TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        self._load()
+        self.logger.info(
+            f"Loaded local vector partition with {len(self._ids)} vectors from {self.directory} "
+            f"({'faiss' if self._index is not None else 'numpy'} search)"
+        )
+
+    def _load(self):
+        if self.vectors_path.exists():
+            self._vectors = np.load(self.vectors_path, mmap_mode="r+")
+            if self._vectors.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Local vector store at {self.directory} has dimension {self._vectors.shape[1]}, "
+                    f"but config.EMBEDDING_OUTPUT_DIMENSION is {self.dimension}; "
+                    f"point config.LOCAL_VECTOR_STORE_DIR at a new directory for a different output dimension"
+                )
+        else:
+            self._vectors = np.lib.format.open_memmap(
+                self.vectors_path, mode="w+", dtype=np.float32, shape=(self.INITIAL_CAPACITY, self.dimension)
+            )
+
+        self._ids: Dict[str, int] = {}
+        self._row_ids: Dict[int, str] = {}
+        self._metadata: Dict[int, Dict] = {}
+        self._alive = np.zeros(len(self._vectors), dtype=bool)
+        for row, vector_id, metadata in self._conn.execute("SELECT row, id, metadata FROM records"):
+            self._ids[vector_id] = row
+            self._row_ids[row] = vector_id
+            self._metadata[row] = json.loads(metadata)
+            self._alive[row] = True
+
+        self._index = None
+        if faiss is not None:
+            self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+            rows = np.flatnonzero(self._alive)
+            if len(rows):
+                self._index.add_with_ids(np.ascontiguousarray(self._vectors[rows]), rows.astype(np.int64))
+        self._version = self._data_version()
+
+    def _data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _refresh_if_stale(self):
+        """Reload vectors, ids and the search index if another process committed changes."""
+        if self._data_version() != self._version:
+            self.logger.info(f"Local vector partition changed on disk, reloading {self.directory}")
+            self._vectors.flush()
+            self._load()
+
+    def _grow(self, min_capacity: int):
+        """Copy the vectors into a larger memmap file and swap it in place."""
+        capacity = max(min_capacity, 2 * len(self._vectors))
+        tmp_path = self.vectors_path.with_suffix(".tmp.npy")
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(capacity, self.dimension))
+        grown[:len(self._vectors)] = self._vectors
+        grown.flush()
+        del grown
+        # Drop the old mapping before replacing the file it maps
+        self._vectors = None
+        os.replace(tmp_path, self.vectors_path)
+        self._vectors = np.load(self.vectors_path, mmap_mode="r+")
+        self._alive = np.concatenate([self._alive, np.zeros(capacity - len(self._alive), dtype=bool)])
+
+    def upsert(self, ids: List[str], embeddings: np.ndarray, metadatas: List[Dict]):
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        # The last write for a repeated id wins, as with sequential upserts
+        latest = {vector_id: i for i, vector_id in enumerate(ids)}
+
+        with self._lock:
+            # Hold the write lock while choosing rows, so another process can't take the same free ones
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh_if_stale()
+                self._write(latest, embeddings, metadatas)
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def _write(self, latest: Dict[str, int], embeddings: np.ndarray, metadatas: List[Dict]):
+        with self._lock:
+            new_ids = [vector_id for vector_id in latest if vector_id not in self._ids]
+            free_rows = np.flatnonzero(~self._alive)
+            if len(free_rows) < len(new_ids):
+                self._grow(len(self._vectors) + len(new_ids) - len(free_rows))
+                free_rows = np.flatnonzero(~self._alive)
+            assigned = dict(zip(new_ids, free_rows.tolist()))
+
+            rows = np.array([self._ids.get(vector_id, assigned.get(vector_id)) for vector_id in latest], dtype=np.int64)
+            positions = list(latest.values())
+            # Vectors are flushed before their metadata commits, so a crash in
+            # between leaves new rows unreferenced (free) rather than half-written
+            self._vectors[rows] = embeddings[positions]
+            self._vectors.flush()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO records (row, id, metadata) VALUES (?, ?, ?)",
+                [(int(row), vector_id, json.dumps(metadatas[i])) for row, (vector_id, i) in zip(rows, latest.items())]
+            )
+            self._conn.commit()
+
+            for row, (vector_id, i) in zip(rows.tolist(), latest.items()):
+                self._ids[vector_id] = row
+                self._row_ids[row] = vector_id
+                self._metadata[row] = metadatas[i]
+            self._alive[rows] = True
+            if self._index is not None:
+                self._index.remove_ids(rows)
+                self._index.add_with_ids(embeddings[positions], rows)
+
+    def _top_k(self, scores: np.ndarray, rows: np.ndarray, top_k: int,
+               include_values: bool) -> List[Tuple[str, float, Dict, Optional[np.ndarray]]]:
+        if len(scores) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best])]
+        return [self._match(int(rows[i]), float(scores[i]), include_values) for i in best]
+
+    def _match(self, row: int, score: float, include_values: bool) -> Tuple[str, float, Dict, Optional[np.ndarray]]:
+        values = np.array(self._vectors[row]) if include_values else None
+        return self._row_ids[row], score, self._metadata[row], values
+
+    def query(self, embedding: np.ndarray, top_k: int, filter: Optional[Dict] = None,
+              include_values: bool = False) -> List[Tuple[str, float, Dict, Optional[np.ndarray]]]:
+        query = np.ascontiguousarray(embedding, dtype=np.float32).reshape(-1)
+        with self._lock:
+            self._refresh_if_stale()
+            if not self._metadata or top_k <= 0:
+                return []
+            if filter:
+                rows = np.array(
+                    [row for row, metadata in self._metadata.items() if matches_filter(metadata, filter)],
+                    dtype=np.int64
+                )
+                if not len(rows):
+                    return []
+                return self._top_k(self._vectors[rows] @ query, rows, top_k, include_values)
+            if self._index is not None:
+                scores, rows = self._index.search(query[None, :], top_k)
+                return [
+                    self._match(int(row), float(score), include_values)
+                    for score, row in zip(scores[0], rows[0]) if row >= 0
+                ]
+
+            rows = np.flatnonzero(self._alive)
+            return self._top_k(self._vectors[rows] @ query, rows, top_k, include_values)
+
+    def fetch(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        with self._lock:
+            self._refresh_if_stale()
+            return {vector_id: np.array(self._vectors[self._ids[vector_id]]) for vector_id in ids if vector_id in self._ids}
+
+    def delete(self, filter: Dict) -> int:
+        return self._delete_where(lambda: [
+            row for row, metadata in self._metadata.items() if matches_filter(metadata, filter)
+        ])
+
+    def delete_ids(self, ids: List[str]) -> int:
+        return self._delete_where(lambda: [self._ids[vector_id] for vector_id in ids if vector_id in self._ids])
+
+    def _delete_where(self, select_rows) -> int:
+        """Delete the rows chosen by select_rows, evaluated against the latest committed state."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh_if_stale()
+                return self._delete_rows(select_rows())
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def _delete_rows(self, rows: List[int]) -> int:
+        with self._lock:
+            if not rows:
+                self._conn.commit()
+                return 0
+            self._conn.executemany("DELETE FROM records WHERE row = ?", [(row,) for row in rows])
+            self._conn.commit()
+            for row in rows:
+                del self._metadata[row]
+                del self._ids[self._row_ids.pop(row)]
+            self._alive[rows] = False
+            if self._index is not None:
+                self._index.remove_ids(np.array(rows, dtype=np.int64))
+            return len(rows)
+
+    def scan_metadata(self, filter: Dict) -> List[Dict]:
+        with self._lock:
+            self._refresh_if_stale()
+            return [metadata for metadata in self._metadata.values() if matches_filter(metadata, filter)]
+
+    def records(self) -> List[Tuple[str, Dict]]:
+        with self._lock:
+            self._refresh_if_stale()
+            return [(self._row_ids[row], metadata) for row, metadata in self._metadata.items()]
+
+    def count(self) -> int:
+        """Number of stored vectors."""
+        with self._lock:
+            self._refresh_if_stale()
+            return len(self._ids)
+
+    def close(self):
+        with self._lock:
+            self._vectors.flush()
+            self._conn.close()
+
+class LocalVectorStore(BaseVectorStore):
+    """In-process vector store persisted under config.LOCAL_VECTOR_STORE_DIR.
+
+    Each namespace is a LocalPartition with its own memory-mapped vectors and
+    metadata table; the default namespace lives in the directory itself (so
+    stores written before namespaces existed load unchanged) and named ones
+    in ns-<name> subdirectories.
+    """
+
+    def __init__(self, directory: Optional[Path] = None):
+        super().__init__()
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+        self.directory = Path(directory or config.LOCAL_VECTOR_STORE_DIR)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._partitions: Dict[str, LocalPartition] = {}
+        self._partitions_lock = threading.Lock()
+        # Open every partition that already exists on disk
+        self._partition("")
+        for path in self.directory.glob("ns-*"):
+            self._partition(path.name[len("ns-"):])
+
+    def _partition(self, namespace: str) -> LocalPartition:
+        with self._partitions_lock:
+            if namespace not in self._partitions:
+                directory = self.directory / f"ns-{namespace}" if namespace else self.directory
+                self._partitions[namespace] = LocalPartition(directory)
+            return self._partitions[namespace]
+
+    def _upsert(self, ids: List[str], embeddings: np.ndarray, metadatas: List[Dict], namespace: str = ""):
+        self._partition(namespace).upsert(ids, embeddings, metadatas)
+
+    def _query(self, embedding: np.ndarray, top_k: int, filter: Optional[Dict] = None, namespace: str = "",
+               include_values: bool = False) -> List[Tuple[str, float, Dict, Optional[np.ndarray]]]:
+        return self._partition(namespace).query(embedding, top_k, filter, include_values)
+
+    def _fetch_vectors(self, ids: List[str], namespace: str = "") -> Dict[str, np.ndarray]:
+        return self._partition(namespace).fetch(ids)
+
+    def _delete(self, filter: Dict, namespace: str = "") -> int:
+        return self._partition(namespace).delete(filter)
+
+    def _delete_ids(self, ids: List[str], namespace: str = "") -> int:
+        return self._partition(namespace).delete_ids(ids)
+
+    def _scan_metadata(self, filter: Dict, namespace: str = "") -> List[Dict]:
+        return self._partition(namespace).scan_metadata(filter)
+
+    def _iter_records(self, namespace: str = "") -> Iterator[Tuple[str, Dict]]:
+        yield from self._partition(namespace).records()
+
+    def count(self) -> int:
+        """Number of stored vectors across all namespaces."""
+        with self._partitions_lock:
+            return sum(partition.count() for partition in self._partitions.values())
+
+    def close(self):
+        with self._partitions_lock:
+            for partition in self._partitions.values():
+                partition.close()
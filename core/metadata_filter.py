@@ -0,0 +1,74 @@
+# core/metadata_filter.py
+from typing import Any, Dict, Optional
+
+from utils.config import config
+
+OPERATORS = {"$eq", "$ne", "$in", "$nin", "$gt", "$gte", "$lt", "$lte", "$exists"}
+
+def _compare(value: Any, operator: str, operand: Any) -> bool:
+    # List-valued metadata matches when any element matches, as in Pinecone
+    values = value if isinstance(value, list) else [value]
+    if operator == "$eq":
+        return operand in values
+    if operator == "$ne":
+        return operand not in values
+    if operator == "$in":
+        return any(v in operand for v in values)
+    if operator == "$nin":
+        return not any(v in operand for v in values)
+    try:
+        if operator == "$gt":
+            return any(v > operand for v in values)
+        if operator == "$gte":
+            return any(v >= operand for v in values)
+        if operator == "$lt":
+            return any(v < operand for v in values)
+        if operator == "$lte":
+            return any(v <= operand for v in values)
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported filter operator: {operator}")
+
+def matches_filter(metadata: Dict, filter: Optional[Dict]) -> bool:
+    """Evaluate a Pinecone-style metadata filter against one record's metadata."""
+    if not filter:
+        return True
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            for operator, operand in condition.items():
+                if operator == "$exists":
+                    if (key in metadata) != bool(operand):
+                        return False
+                elif key not in metadata or not _compare(metadata[key], operator, operand):
+                    return False
+        elif key not in metadata or not _compare(metadata[key], "$eq", condition):
+            return False
+    return True
+
+def validate_filter(filter: Optional[Dict]):
+    """Raise ValueError unless a filter only uses indexed fields and supported operators."""
+    if not filter:
+        return
+    if not isinstance(filter, dict):
+        raise ValueError("A metadata filter must be an object")
+    for key, condition in filter.items():
+        if key in ("$and", "$or"):
+            if not isinstance(condition, list):
+                raise ValueError(f"{key} takes a list of filters")
+            for clause in condition:
+                validate_filter(clause)
+            continue
+        if key not in config.VECTOR_METADATA_FIELDS:
+            raise ValueError(f"Cannot filter on {key!r}; indexed fields are {config.VECTOR_METADATA_FIELDS}")
+        if isinstance(condition, dict):
+            for operator, operand in condition.items():
+                if operator not in OPERATORS:
+                    raise ValueError(f"Unsupported filter operator {operator!r}")
+                if operator in ("$in", "$nin") and not isinstance(operand, list):
+                    raise ValueError(f"{operator} takes a list")
@@ -0,0 +1,107 @@
+# core/onnx_backend.py
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Part of the export directory name, so changing it triggers a fresh export
+ONNX_OPSET = 17
+
+class OnnxEmbeddingBackend:
+    """ONNX Runtime CPU inference for the embedding model.
+
+    The model is exported to ONNX once (and optionally dynamically quantized
+    to int8) into a directory under ``export_dir`` named after the model and
+    opset; later runs with the same model load the exported file directly.
+    """
+
+    def __init__(self, model_name: str, export_dir: Path, quantize: bool = False,
+                 num_threads: Optional[int] = None):
+        import onnxruntime as ort
+
+        self.model_name = model_name
+        model_slug = re.sub(r"[^A-Za-z0-9._-]+", "--", model_name).strip("-")
+        self.export_dir = Path(export_dir) / f"{model_slug}-opset{ONNX_OPSET}"
+        self.quantize = quantize
+        self.model_path = self._ensure_exported()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            str(self.model_path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        logger.info(f"Loaded ONNX embedding model: {self.model_path}")
+
+    def _ensure_exported(self) -> Path:
+        """Export (and quantize) the model if it has not been done yet."""
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+        fp32_path = self.export_dir / "model.onnx"
+        int8_path = self.export_dir / "model.int8.onnx"
+
+        if not fp32_path.exists():
+            self._export(fp32_path)
+
+        if not self.quantize:
+            return fp32_path
+
+        if not int8_path.exists():
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            logger.info(f"Quantizing {fp32_path} to int8")
+            quantize_dynamic(
+                str(fp32_path),
+                str(int8_path),
+                weight_type=QuantType.QInt8,
+                use_external_data_format=True
+            )
+        return int8_path
+
+    def _export(self, output_path: Path):
+        """Export the transformer encoder to ONNX with dynamic batch and sequence axes."""
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        logger.info(f"Exporting {self.model_name} to ONNX at {output_path}")
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        model = AutoModel.from_pretrained(self.model_name, add_pooling_layer=False)
+        model.eval()
+
+        sample = tokenizer(["query: export sample"], return_tensors="pt")
+        tmp_path = output_path.with_suffix(".tmp.onnx")
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                # A trailing dict is passed as keyword arguments to forward()
+                ({"input_ids": sample["input_ids"], "attention_mask": sample["attention_mask"]},),
+                str(tmp_path),
+                input_names=["input_ids", "attention_mask"],
+                output_names=["last_hidden_state"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "last_hidden_state": {0: "batch", 1: "sequence"},
+                },
+                opset_version=ONNX_OPSET,
+                do_constant_folding=True,
+                dynamo=False
+            )
+        # Only publish a complete export, so an interrupted run is retried next time
+        os.replace(tmp_path, output_path)
+
+    def __call__(self, features: Dict[str, np.ndarray]) -> np.ndarray:
+        """Return the CLS-token hidden state for a padded batch."""
+        inputs = {
+            name: np.asarray(value, dtype=np.int64)
+            for name, value in features.items()
+            if name in self.input_names
+        }
+        last_hidden_state = self.session.run(["last_hidden_state"], inputs)[0]
+        return last_hidden_state[:, 0]
@@ -0,0 +1,118 @@
+# core/reranker.py
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+from utils.config import config
+
+logger = logging.getLogger(__name__)
+
+class CrossEncoderReranker:
+    """Rescores retrieved chunks against the query with a small cross-encoder on CPU.
+
+    All candidates are scored in one padded batch. The pass runs on a
+    dedicated thread; waiting for an earlier pass to finish and the pass
+    itself share one time budget. Past it, rerank returns the candidates in
+    their retrieval order so a slow pass never holds up the answer.
+    """
+
+    def __init__(self, model_name: Optional[str] = None):
+        self.model_name = model_name or config.RERANKER_MODEL
+        logger.info(f"Loading reranker model {self.model_name}")
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        self.model = AutoModelForSequenceClassification.from_pretrained(self.model_name)
+        self.model.eval()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reranker")
+        self._busy = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'passes': 0, 'timeouts': 0, 'skipped_busy': 0, 'seconds': 0.0}
+
+    def warm_up(self):
+        """Score one pair so the first request does not pay for lazy allocations."""
+        start_time = time.perf_counter()
+        self.score("warm up", ["warm up"])
+        logger.info(f"Reranker warm-up took {time.perf_counter() - start_time:.2f}s")
+
+    def score(self, query: str, texts: List[str]) -> np.ndarray:
+        """Relevance logits of (query, text) pairs, higher is better."""
+        features = self.tokenizer(
+            [query] * len(texts),
+            texts,
+            padding=True,
+            truncation="only_second",
+            max_length=config.RERANKER_MAX_LENGTH,
+            return_tensors="pt"
+        )
+        with torch.no_grad():
+            logits = self.model(**features).logits
+        # Single-logit heads score relevance directly; two-class heads put it last
+        return logits[:, -1].float().numpy()
+
+    def _timed_score(self, query: str, texts: List[str]) -> np.ndarray:
+        start_time = time.perf_counter()
+        try:
+            return self.score(query, texts)
+        finally:
+            elapsed = time.perf_counter() - start_time
+            self._busy.release()
+            with self._stats_lock:
+                self._stats['passes'] += 1
+                self._stats['seconds'] += elapsed
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def rerank(self, query: str, docs: List[Dict], k: int, budget_seconds: Optional[float] = None) -> List[Dict]:
+        """Return the k best docs by cross-encoder score, each with a 'rerank_score'.
+
+        Falls back to the first k docs in their given order when the pass
+        doesn't finish within budget_seconds (default config.RERANKER_BUDGET_MS).
+        """
+        if len(docs) <= 1:
+            return docs[:k]
+        if budget_seconds is None:
+            budget_seconds = config.RERANKER_BUDGET_MS / 1000
+
+        # One pass at a time: wait for an earlier pass only as long as the budget
+        # allows, and give the pass itself whatever is left
+        start_time = time.perf_counter()
+        if not self._busy.acquire(timeout=budget_seconds):
+            self._count('skipped_busy')
+            logger.warning(f"Reranker busy for {budget_seconds * 1000:.0f}ms, keeping retrieval order")
+            return docs[:k]
+        remaining = budget_seconds - (time.perf_counter() - start_time)
+        if remaining <= 0:
+            self._busy.release()
+            self._count('skipped_busy')
+            return docs[:k]
+
+        future = self._executor.submit(self._timed_score, query, [doc["text"] for doc in docs])
+        try:
+            scores = future.result(timeout=remaining)
+        except TimeoutError:
+            # The pass can't be interrupted; it finishes in the background and frees the reranker
+            self._count('timeouts')
+            logger.warning(f"Reranking {len(docs)} candidates exceeded {budget_seconds * 1000:.0f}ms, keeping retrieval order")
+            return docs[:k]
+        except Exception as e:
+            logger.error(f"Reranking failed, keeping retrieval order: {str(e)}")
+            return docs[:k]
+
+        best = np.argsort(-scores, kind="stable")[:k]
+        return [{**docs[i], "rerank_score": float(scores[i])} for i in best]
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['mean_seconds'] = stats['seconds'] / stats['passes'] if stats['passes'] else 0.0
+        return stats
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -1,6 +1,38 @@
 from typing import List, Dict
 import asyncio
 
+import numpy as np
+
+def collapse_near_duplicates(vectors: np.ndarray, threshold: float) -> List[int]:
+    """Indices of the candidates to keep, in order; a candidate whose cosine to an
+    already-kept one is >= threshold is dropped as a near-duplicate."""
+    kept: List[int] = []
+    for i, vector in enumerate(vectors):
+        if kept and float(np.max(vectors[kept] @ vector)) >= threshold:
+            continue
+        kept.append(i)
+    return kept
+
+def maximal_marginal_relevance(relevance: np.ndarray, vectors: np.ndarray, k: int,
+                               lambda_mult: float = 0.7) -> List[int]:
+    """Greedily pick k candidate indices maximizing
+    lambda * relevance - (1 - lambda) * max cosine to the already-picked set."""
+    if not len(relevance):
+        return []
+    similarity = vectors @ vectors.T
+    selected = [int(np.argmax(relevance))]
+    redundancy = similarity[selected[0]].copy()
+    remaining = np.ones(len(relevance), dtype=bool)
+    remaining[selected[0]] = False
+    while len(selected) < min(k, len(relevance)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~remaining] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        remaining[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return selected
+
 class RetrievalOptimizer:
     def __init__(self, vector_store):
         self.vector_store = vector_store
@@ -18,6 +50,10 @@ class RetrievalOptimizer:
             lambda: self.vector_store.search(query, embedding, k)
         )
         
+        # Hybrid results are already in fused rank order
+        if results and 'rrf_score' in results[0]:
+            return results
+
         # Sort by relevance score
         return sorted(results, key=lambda x: x['distance'])
         
\ No newline at end of file
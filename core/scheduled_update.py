@@ -12,8 +12,8 @@ from pathlib import Path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from core.web_scraper import IndigoWebScraper
-from core.embeddings import EmbeddingManager
-from core.vector_store import VectorStore
+from core.embedding_pool import create_ingestion_embedder
+from core.vector_store import create_vector_store
 
 # Set up logging
 logging.basicConfig(
@@ -28,13 +28,18 @@ logger = logging.getLogger(__name__)
 
 def update_website_content():
     """Update the vector database with fresh website content."""
+    embedding_manager = None
     try:
         logger.info(f"Starting scheduled content update at {datetime.now()}")
         
         # Initialize components
         scraper = IndigoWebScraper()
-        embedding_manager = EmbeddingManager()
-        vector_store = VectorStore()
+        embedding_manager = create_ingestion_embedder()
+        vector_store = create_vector_store()
+        vector_store.ensure_local_indexes()
+
+        # Retry batches that failed to upload on a previous run
+        vector_store.replay_dead_letters()
         
         # Scrape all target sections
         logger.info("Scraping website content...")
@@ -48,23 +53,50 @@ def update_website_content():
         
         # Generate embeddings
         logger.info("Generating embeddings...")
-        embeddings = embedding_manager.generate_embeddings(
+        embeddings = embedding_manager.embed_documents(
             [chunk['text'] for chunk in all_chunks]
         )
+        stats = embedding_manager.last_stats
+        logger.info(f"Embedding throughput: {stats['tokens_per_sec']:.0f} tokens/sec "
+                    f"({stats['tokens']} tokens, {stats['batches']} batches, "
+                    f"{stats.get('cache_hits', 0)} chunks served from cache, "
+                    f"{stats.get('split', 0)} split, {stats.get('truncated', 0)} truncated)")
         
         # Upload to vector database
         logger.info("Uploading to vector database...")
-        vector_store.add_documents(all_chunks, embeddings)
+        summary = vector_store.add_documents(all_chunks, embeddings)
         
-        logger.info("Content update completed successfully")
+        if summary['failed']:
+            logger.error(f"Content update finished with {summary['failed']} chunks in the dead-letter file; "
+                         f"they will be retried on the next run")
+        else:
+            logger.info("Content update completed successfully")
     except Exception as e:
         logger.error(f"Error during scheduled update: {str(e)}", exc_info=True)
+    finally:
+        # Shut down pool workers between runs instead of holding the model in RAM for a day
+        if embedding_manager is not None:
+            embedding_manager.close()
 
 def main():
     parser = argparse.ArgumentParser(description="Schedule regular updates of website content")
     parser.add_argument("--interval", type=int, default=24, help="Update interval in hours")
     parser.add_argument("--run-now", action="store_true", help="Run an update immediately")
+    parser.add_argument("--replay-dead-letters", action="store_true",
+                        help="Retry upserts recorded in the dead-letter file, then exit")
+    parser.add_argument("--migrate-namespaces", action="store_true",
+                        help="Move vectors from the default namespace into their source namespaces, then exit")
     args = parser.parse_args()
+
+    if args.replay_dead_letters:
+        create_vector_store().replay_dead_letters()
+        return
+
+    if args.migrate_namespaces:
+        vector_store = create_vector_store()
+        vector_store.ensure_local_indexes()
+        vector_store.migrate_namespaces()
+        return
     
     if args.run_now:
         logger.info("Running immediate update...")
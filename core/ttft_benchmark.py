@@ -0,0 +1,77 @@
+# core/ttft_benchmark.py
+import os
+import sys
+import time
+import argparse
+import logging
+from typing import Dict, List
+
+import numpy as np
+
+# Add parent directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.embeddings import EmbeddingManager
+from core.vector_store import create_vector_store
+from core.llm import LLMManager, CLARIFICATION_MODES
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+SAMPLE_QUESTIONS = [
+    "How do I add a new location in Cytric?",
+    "What is a trip purpose?",
+    "How do I assign a division to a traveler?",
+    "Which fields are mandatory for a trip purpose definition?",
+]
+
+def time_to_first_token(manager: LLMManager, question: str, context: List[Dict]) -> Dict[str, float]:
+    """Milliseconds until the first streamed chunk and until the stream ends, as seen by the caller."""
+    start = time.perf_counter()
+    first = None
+    for _ in manager.stream_response(question, context, []):
+        if first is None:
+            first = time.perf_counter()
+    end = time.perf_counter()
+    return {"ttft_ms": ((first or end) - start) * 1000, "total_ms": (end - start) * 1000}
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to first token of /chat/stream for each clarification mode")
+    parser.add_argument("--modes", nargs="+", choices=CLARIFICATION_MODES, default=list(CLARIFICATION_MODES))
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions of each question per mode")
+    parser.add_argument("--k", type=int, default=5, help="Context chunks retrieved per question")
+    args = parser.parse_args()
+
+    # Retrieve once so every mode answers from the same context
+    embedding_manager = EmbeddingManager()
+    vector_store = create_vector_store()
+    contexts = {
+        question: vector_store.search(question, embedding_manager.embed_query(question), k=args.k)
+        for question in SAMPLE_QUESTIONS
+    }
+
+    results = {}
+    for mode in args.modes:
+        manager = LLMManager(clarification_mode=mode)
+        runs = [
+            time_to_first_token(manager, question, contexts[question])
+            for _ in range(args.repeat)
+            for question in SAMPLE_QUESTIONS
+        ]
+        results[mode] = {
+            "ttft_p50": float(np.percentile([run["ttft_ms"] for run in runs], 50)),
+            "ttft_p95": float(np.percentile([run["ttft_ms"] for run in runs], 95)),
+            "total_p50": float(np.percentile([run["total_ms"] for run in runs], 50)),
+        }
+        logger.info(f"Finished {len(runs)} requests in {mode} mode")
+
+    print(f"\n{'mode':<12}{'TTFT p50 ms':>14}{'TTFT p95 ms':>14}{'total p50 ms':>15}")
+    for mode, row in results.items():
+        print(f"{mode:<12}{row['ttft_p50']:>14.0f}{row['ttft_p95']:>14.0f}{row['total_p50']:>15.0f}")
+
+if __name__ == "__main__":
+    main()
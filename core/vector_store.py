@@ -1,9 +1,24 @@
 # # core/vector_store.py
 from pinecone import Pinecone, ServerlessSpec
-from typing import List, Dict, Optional, Set, Tuple
+from typing import Any, Iterator, List, Dict, Optional, Set, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import os
+import json
+import time
+import random
+import hashlib
+import threading
 import numpy as np
 import streamlit as st
 from utils.config import config
+from utils.helpers import vector_to_transport
+from utils.cache import TTLCache, normalize_query
+from core.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from core.doc_store import DocumentStore
+from core.index_manifest import IndexManifest
+from core.metadata_filter import matches_filter
+from core.retrieval_optimizer import collapse_near_duplicates, maximal_marginal_relevance
 import urllib3
 import ssl
 import requests
@@ -16,9 +31,619 @@ import logging
 # sys.modules["sqlite3"] = __import__("pysqlite3")
 ####################
 
-class VectorStore:
+def namespace_for(metadata: Dict) -> str:
+    """Namespace a chunk is written to: one partition per source type when namespaces are enabled."""
+    if not config.VECTOR_NAMESPACES_ENABLED:
+        return ""
+    # Web scraper chunks carry their site section; everything else is an uploaded document
+    return "web" if metadata.get("section") else "documents"
+
+def all_namespaces() -> List[str]:
+    """Every namespace that may hold vectors, including the default one used before partitioning."""
+    if not config.VECTOR_NAMESPACES_ENABLED:
+        return [""]
+    return [""] + list(config.VECTOR_NAMESPACES)
+
+class BaseVectorStore:
+    """Backend-independent document indexing and search.
+
+    Subclasses implement the storage primitives (_upsert, _query, _delete,
+    _scan_metadata and _iter_records); everything callers use is defined here
+    so the Pinecone and local backends behave identically. Chunk text and full
+    metadata live in a local DocumentStore; the index itself only carries the
+    fields in config.VECTOR_METADATA_FIELDS. With hybrid search enabled, a
+    BM25 index over chunk text is kept in step with the vectors and fused with
+    the dense results. With namespaces enabled, each source type is written to
+    its own partition and searches fan out over the requested partitions.
+    """
 
     def __init__(self):
+        self.doc_store = DocumentStore(config.DOC_STORE_PATH)
+        self.manifest = IndexManifest(config.INDEX_MANIFEST_PATH)
+        self.lexical_index = LexicalIndex(config.LEXICAL_INDEX_PATH) if config.HYBRID_SEARCH_ENABLED else None
+        # Runs the lexical lookup and per-namespace queries concurrently
+        self._search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="vector-search")
+        self.result_cache = TTLCache(config.RETRIEVAL_CACHE_SIZE, config.RETRIEVAL_CACHE_TTL)
+        # Bumped by every write through this instance; part of each cache key,
+        # so stale entries are never returned and simply age out of the LRU
+        self.generation = 0
+        self._generation_lock = threading.Lock()
+        self._dead_letter_lock = threading.Lock()
+
+    def _bump_generation(self):
+        with self._generation_lock:
+            self.generation += 1
+
+    def _result_cache_key(self, query: str, embedding: np.ndarray, k: int, namespaces: List[str],
+                          filter: Optional[Dict] = None) -> Tuple:
+        # Disk versions change when another process writes to the store: every write
+        # goes through the manifest and doc store, and the lexical index when enabled
+        external_version = (
+            self.manifest.disk_version(),
+            self.doc_store.disk_version(),
+            self.lexical_index.disk_version() if self.lexical_index is not None else 0
+        )
+        return (
+            self.generation,
+            external_version,
+            normalize_query(query),
+            hashlib.blake2b(embedding.tobytes(), digest_size=16).hexdigest(),
+            k,
+            tuple(namespaces),
+            json.dumps(filter, sort_keys=True) if filter else None
+        )
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Result cache counters plus the current write generation."""
+        return {**self.result_cache.stats(), "generation": self.generation}
+
+    def _upsert(self, ids: List[str], embeddings: np.ndarray, metadatas: List[Dict], namespace: str = ""):
+        raise NotImplementedError
+
+    def _query(self, embedding: np.ndarray, top_k: int, filter: Optional[Dict] = None, namespace: str = "",
+               include_values: bool = False) -> List[Tuple[str, float, Dict, Optional[np.ndarray]]]:
+        """Return (id, cosine score, metadata, vector or None) for the best matches, best first."""
+        raise NotImplementedError
+
+    def _fetch_vectors(self, ids: List[str], namespace: str = "") -> Dict[str, np.ndarray]:
+        """Return stored vectors by id; unknown ids are omitted."""
+        raise NotImplementedError
+
+    def _delete(self, filter: Dict, namespace: str = "") -> int:
+        raise NotImplementedError
+
+    def _delete_ids(self, ids: List[str], namespace: str = "") -> int:
+        raise NotImplementedError
+
+    def _scan_metadata(self, filter: Dict, namespace: str = "") -> List[Dict]:
+        """Return the metadata of stored vectors matching a filter."""
+        raise NotImplementedError
+
+    def _iter_records(self, namespace: str = "") -> Iterator[Tuple[str, Dict]]:
+        """Yield (id, metadata) for every stored vector in a namespace."""
+        raise NotImplementedError
+
+    def _query_namespaces(self, embedding: np.ndarray, top_k: int, namespaces: List[str], filter: Optional[Dict] = None,
+                          include_values: bool = False) -> List[Tuple[str, float, Dict, Optional[np.ndarray]]]:
+        """Query several namespaces concurrently and merge their matches by score."""
+        if len(namespaces) == 1:
+            return self._query(embedding, top_k, filter, namespaces[0], include_values)
+        futures = [
+            self._search_executor.submit(self._query, embedding, top_k, filter, namespace, include_values)
+            for namespace in namespaces
+        ]
+        # Every partition scores with cosine similarity on the same normalized
+        # embeddings, so scores are directly comparable across partitions
+        merged = [match for future in futures for match in future.result()]
+        return sorted(merged, key=lambda match: match[1], reverse=True)[:top_k]
+
+    def _estimate_record_bytes(self, vector_id: str, metadata: Dict) -> int:
+        """Approximate serialized size of one upsert record (JSON floats run ~10 bytes each)."""
+        bytes_per_value = 8 if config.VECTOR_TRANSPORT_DTYPE == "float16" else 11
+        return len(vector_id) + len(json.dumps(metadata)) + config.EMBEDDING_OUTPUT_DIMENSION * bytes_per_value + 64
+
+    def _make_upsert_batches(self, ids: List[str], metadatas: List[Dict], namespaces: List[str]) -> List[Tuple[int, int]]:
+        """Split records into (start, end) ranges under the count and byte limits, one namespace per batch."""
+        batches = []
+        start, batch_bytes = 0, 0
+        for i, (vector_id, metadata) in enumerate(zip(ids, metadatas)):
+            record_bytes = self._estimate_record_bytes(vector_id, metadata)
+            if i > start and (i - start >= config.UPSERT_MAX_BATCH_SIZE
+                              or batch_bytes + record_bytes > config.UPSERT_MAX_BATCH_BYTES
+                              or namespaces[i] != namespaces[start]):
+                batches.append((start, i))
+                start, batch_bytes = i, 0
+            batch_bytes += record_bytes
+        if start < len(ids):
+            batches.append((start, len(ids)))
+        return batches
+
+    @staticmethod
+    def _index_metadata(metadata: Dict) -> Dict:
+        """The small, filterable subset of a chunk's metadata that is stored in the index."""
+        return {key: metadata[key] for key in config.VECTOR_METADATA_FIELDS if key in metadata}
+
+    def _upsert_with_retries(self, ids: List[str], embeddings: np.ndarray, metadatas: List[Dict],
+                             texts: List[str], namespace: str) -> Tuple[Optional[Exception], int]:
+        """Upsert one batch with exponential backoff; returns (final error or None, retries used).
+
+        Only the vector-store calls are retried; the local bookkeeping runs
+        once the batch has landed.
+        """
+        for attempt in range(config.UPSERT_MAX_RETRIES + 1):
+            try:
+                self._upsert(ids, embeddings, metadatas, namespace)
+                self._bump_generation()
+                self._delete_moved_copies(ids, namespace)
+                break
+            except Exception as e:
+                if attempt == config.UPSERT_MAX_RETRIES:
+                    return e, attempt
+                delay = config.UPSERT_BACKOFF_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.5)
+                self.logger.warning(f"Upsert of {len(ids)} vectors failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+        self.manifest.record(ids, metadatas, namespace)
+        if self.lexical_index is not None:
+            self.lexical_index.add(ids, texts, metadatas)
+        return None, attempt
+
+    def _delete_moved_copies(self, ids: List[str], namespace: str):
+        """Delete the copies of just-written chunks that the manifest records in another namespace."""
+        moved: Dict[str, List[str]] = {}
+        for vector_id, old_namespace in self.manifest.recorded_namespaces(ids).items():
+            if old_namespace != namespace:
+                moved.setdefault(old_namespace, []).append(vector_id)
+        for old_namespace, moved_ids in moved.items():
+            self._delete_ids(moved_ids, old_namespace)
+            self.logger.info(f"Deleted {len(moved_ids)} vectors moved from namespace '{old_namespace}' to '{namespace}'")
+
+    def migrate_namespaces(self, batch_size: int = 500) -> int:
+        """Move vectors written before namespaces were enabled into their source partition.
+
+        Unchanged content is never re-upserted by change detection, so the
+        default namespace keeps its copies until they are moved here. Returns
+        the number of vectors moved.
+        """
+        if not config.VECTOR_NAMESPACES_ENABLED:
+            return 0
+        moved = 0
+        records = list(self._iter_records(""))
+        for start in range(0, len(records), batch_size):
+            batch = records[start:start + batch_size]
+            vectors = self._fetch_vectors([vector_id for vector_id, _ in batch], "")
+            by_namespace: Dict[str, List[Tuple[str, Dict]]] = {}
+            for vector_id, metadata in batch:
+                if vector_id in vectors:
+                    by_namespace.setdefault(namespace_for(metadata), []).append((vector_id, metadata))
+            for namespace, group in by_namespace.items():
+                if namespace == "":
+                    continue
+                ids = [vector_id for vector_id, _ in group]
+                legacy = [(vector_id, metadata['text'], metadata) for vector_id, metadata in group if 'text' in metadata]
+                if legacy:
+                    # Old vectors carry their text in the index; keep it once they are slimmed down
+                    self.doc_store.put_many(*map(list, zip(*legacy)))
+                metadatas = [self._index_metadata(metadata) for _, metadata in group]
+                self._upsert(ids, np.stack([vectors[vector_id] for vector_id in ids]), metadatas, namespace)
+                self.manifest.record(ids, metadatas, namespace)
+                self._delete_ids(ids, "")
+                self._bump_generation()
+                moved += len(ids)
+        self.logger.info(f"Moved {moved} vectors from the default namespace into source namespaces")
+        return moved
+
+    def _write_dead_letter(self, ids: List[str], embeddings: np.ndarray, metadatas: List[Dict],
+                           texts: List[str], error: Exception):
+        """Append a failed batch to the dead-letter file so it can be replayed later."""
+        path = Path(config.UPSERT_DEAD_LETTER_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        record = {
+            'failed_at': time.time(),
+            'error': str(error),
+            'ids': ids,
+            'embeddings': np.asarray(embeddings, dtype=np.float32).tolist(),
+            'metadatas': metadatas,
+            'texts': texts
+        }
+        with self._dead_letter_lock, open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
+
+    def _upsert_records(self, ids: List[str], embeddings: np.ndarray, metadatas: List[Dict],
+                        texts: List[str], dead_letter: bool = True) -> Dict[str, Any]:
+        start_time = time.perf_counter()
+        # Group records by namespace so each batch targets a single partition
+        namespaces = [namespace_for(metadata) for metadata in metadatas]
+        order = sorted(range(len(ids)), key=lambda i: namespaces[i])
+        ids = [ids[i] for i in order]
+        embeddings = embeddings[order]
+        metadatas = [metadatas[i] for i in order]
+        texts = [texts[i] for i in order]
+        namespaces = [namespaces[i] for i in order]
+        batches = self._make_upsert_batches(ids, metadatas, namespaces)
+        summary = {
+            'requested': len(ids),
+            'upserted': 0,
+            'failed': 0,
+            'batches': len(batches),
+            'failed_batches': 0,
+            'retries': 0,
+            'seconds': 0.0,
+            'dead_letter_path': None
+        }
+        failures = []
+
+        def run(batch: Tuple[int, int]):
+            start, end = batch
+            return batch, self._upsert_with_retries(
+                ids[start:end], embeddings[start:end], metadatas[start:end], texts[start:end], namespaces[start]
+            )
+
+        with ThreadPoolExecutor(max_workers=max(1, config.UPSERT_CONCURRENCY)) as executor:
+            for (start, end), (error, retries) in executor.map(run, batches):
+                summary['retries'] += retries
+                if error is None:
+                    summary['upserted'] += end - start
+                    self.logger.info(f"Successfully upserted {end - start} vectors")
+                    continue
+                summary['failed'] += end - start
+                summary['failed_batches'] += 1
+                self.logger.error(f"Error upserting batch of {end - start} vectors after {retries} retries: {str(error)}")
+                failures.append((start, end, error))
+
+        if failures and dead_letter:
+            for start, end, error in failures:
+                self._write_dead_letter(ids[start:end], embeddings[start:end], metadatas[start:end],
+                                        texts[start:end], error)
+            summary['dead_letter_path'] = str(config.UPSERT_DEAD_LETTER_PATH)
+            self.logger.error(f"Wrote {summary['failed_batches']} failed batches to {config.UPSERT_DEAD_LETTER_PATH}")
+
+        summary['seconds'] = time.perf_counter() - start_time
+        return summary
+
+    def add_documents(self, documents: List[Dict[str, str]], embeddings: Union[np.ndarray, List[List[float]]]) -> Dict[str, Any]:
+        """Add documents and their embeddings to the index.
+
+        Records are batched by count and estimated request size and upserted
+        concurrently with retries; batches that still fail are appended to the
+        dead-letter file (see replay_dead_letters). Returns a summary of what
+        was written.
+        """
+        try:
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+            ids = [doc['metadata'].get('chunk_id', str(hash(doc['text']))) for doc in documents]
+            texts = [doc['text'] for doc in documents]
+            # Text and full metadata go to the local doc store first, so every
+            # vector is hydratable as soon as it becomes searchable
+            self.doc_store.put_many(ids, texts, [doc.get('metadata', {}) for doc in documents])
+            metadatas = [self._index_metadata(doc.get('metadata', {})) for doc in documents]
+            summary = self._upsert_records(ids, embeddings, metadatas, texts)
+            self.logger.info(
+                f"Upserted {summary['upserted']}/{summary['requested']} vectors in {summary['batches']} batches "
+                f"({summary['retries']} retries, {summary['failed']} failed) in {summary['seconds']:.2f}s"
+            )
+            return summary
+
+        except Exception as e:
+            self.logger.error(f"Document addition error: {str(e)}")
+            raise
+
+    def replay_dead_letters(self) -> Dict[str, Any]:
+        """Retry every batch in the dead-letter file; batches that fail again stay in it."""
+        path = Path(config.UPSERT_DEAD_LETTER_PATH)
+        summary = {'batches': 0, 'upserted': 0, 'failed': 0}
+        if not path.exists():
+            return summary
+
+        with self._dead_letter_lock:
+            with open(path, encoding='utf-8') as f:
+                records = [json.loads(line) for line in f if line.strip()]
+
+            remaining = []
+            for record in records:
+                embeddings = np.asarray(record['embeddings'], dtype=np.float32)
+                # Batches dead-lettered before the doc store kept their text in the metadata
+                texts = record.get('texts') or [metadata.get('text', '') for metadata in record['metadatas']]
+                result = self._upsert_records(record['ids'], embeddings, record['metadatas'], texts,
+                                              dead_letter=False)
+                summary['batches'] += 1
+                summary['upserted'] += result['upserted']
+                summary['failed'] += result['failed']
+                if result['failed']:
+                    remaining.append(record)
+
+            if remaining:
+                tmp_path = path.with_suffix(".tmp")
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.writelines(json.dumps(record) + "\n" for record in remaining)
+                os.replace(tmp_path, path)
+            else:
+                path.unlink()
+
+        self.logger.info(
+            f"Replayed {summary['batches']} dead-letter batches: "
+            f"{summary['upserted']} vectors upserted, {summary['failed']} still failing"
+        )
+        return summary
+
+    def search(self, query: str, embedding: Union[np.ndarray, List[float]], k: int = 3,
+               namespaces: Optional[List[str]] = None, filter: Optional[Dict] = None) -> List[Dict]:
+        """Enhanced search with better source handling.
+
+        namespaces restricts the search to some source partitions; by default
+        every partition is searched. filter is a Pinecone-style metadata filter
+        over config.VECTOR_METADATA_FIELDS, applied inside the index.
+        """
+        try:
+            embedding = np.asarray(embedding, dtype=np.float32)
+            namespaces = list(namespaces) if namespaces else all_namespaces()
+            cache_key = self._result_cache_key(query, embedding, k, namespaces, filter)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                # Copies, so callers can't mutate the cached entry
+                return [dict(result, metadata=dict(result['metadata'])) for result in cached]
+
+            # With diversification on, rank a wider pool and pick k distinct chunks from it
+            pool_size = max(k, k * config.MMR_CANDIDATE_MULTIPLIER) if config.MMR_ENABLED else k
+            if self.lexical_index is not None:
+                matches = self._hybrid_query(query, embedding, pool_size, namespaces, filter, config.MMR_ENABLED)
+            else:
+                matches = [
+                    (vector_id, score, metadata, None, values)
+                    for vector_id, score, metadata, values in self._query_namespaces(
+                        embedding, pool_size, namespaces, filter, config.MMR_ENABLED
+                    )
+                ]
+            if config.MMR_ENABLED:
+                matches = self._diversify(matches, embedding, k, namespaces)
+
+            # One batched lookup for the text and full metadata of every hit
+            hydrated = self.doc_store.get_many(match[0] for match in matches)
+
+            processed_results = []
+            missing = []
+            for vector_id, score, metadata, fused_score, _ in matches:
+                text, stored_metadata = hydrated.get(vector_id, (None, None))
+                metadata = dict(stored_metadata if stored_metadata is not None else metadata or {})
+                if text is None:
+                    # Vectors written before the doc store carry their text in the index
+                    text = metadata.get('text')
+                metadata.pop('text', None)
+                if not text:
+                    # Slim-metadata vector whose doc-store entry is missing: nothing to show for it
+                    missing.append(vector_id)
+                    continue
+
+                # Enhance metadata with heading information if available
+                if 'headings' in metadata:
+                    for heading in metadata['headings']:
+                        if heading['text'].lower() in text.lower():
+                            metadata['url'] = f"{metadata.get('url', '')}#{heading['id']}"
+                            break
+
+                result = {
+                    'text': text,
+                    'metadata': metadata,
+                    # Lexical-only hits have no cosine score; treat them as orthogonal
+                    'distance': 1 - score if score is not None else 1.0
+                }
+                if fused_score is not None:
+                    result['rrf_score'] = fused_score
+                processed_results.append(result)
+            if missing:
+                self.logger.warning(
+                    f"Dropped {len(missing)} search hits with no text in the doc store or index "
+                    f"(run rebuild_local_indexes to backfill): {missing[:5]}"
+                )
+
+            self.result_cache.set(
+                cache_key, [dict(result, metadata=dict(result['metadata'])) for result in processed_results]
+            )
+            return processed_results
+        except Exception as e:
+            self.logger.error(f"Search error: {str(e)}")
+            return []
+
+    def _hybrid_query(self, query: str, embedding: np.ndarray, k: int, namespaces: List[str],
+                      filter: Optional[Dict] = None, include_values: bool = False
+                      ) -> List[Tuple[str, Optional[float], Dict, float, Optional[np.ndarray]]]:
+        """Dense and BM25 retrieval run in parallel, fused by reciprocal rank.
+
+        Returns (id, cosine score or None, metadata, fused score, vector or
+        None), best first; lexical-only hits have no score or vector.
+        """
+        depth = max(k, config.HYBRID_CANDIDATES)
+        lexical_future = self._search_executor.submit(self.lexical_index.search, query, depth)
+        dense = self._query_namespaces(embedding, depth, namespaces, filter, include_values)
+        try:
+            lexical = lexical_future.result()
+        except Exception as e:
+            self.logger.error(f"Lexical search error: {str(e)}")
+            lexical = []
+        # The lexical index spans all sources; keep only hits from the requested
+        # partitions that pass the same metadata filter as the dense query
+        lexical = [
+            hit for hit in lexical
+            if namespace_for(hit[2]) in namespaces and matches_filter(hit[2], filter)
+        ]
+
+        dense_by_id = {vector_id: (score, metadata, values) for vector_id, score, metadata, values in dense}
+        lexical_by_id = {doc_id: metadata for doc_id, _, metadata in lexical}
+        fused = reciprocal_rank_fusion(
+            [[match[0] for match in dense], [doc_id for doc_id, _, _ in lexical]],
+            k,
+            config.HYBRID_RRF_K
+        )
+        results = []
+        for doc_id, fused_score in fused:
+            score, metadata, values = dense_by_id.get(doc_id, (None, lexical_by_id.get(doc_id), None))
+            results.append((doc_id, score, metadata, fused_score, values))
+        return results
+
+    def _diversify(self, matches: List[Tuple], embedding: np.ndarray, k: int,
+                   namespaces: List[str]) -> List[Tuple]:
+        """Collapse near-duplicate candidates, then pick k of the rest by maximal marginal relevance."""
+        if len(matches) <= 1:
+            return matches[:k]
+
+        vectors = {match[0]: match[4] for match in matches if match[4] is not None}
+        missing = [match[0] for match in matches if match[4] is None]
+        # Lexical-only hits come back without vectors; fetch them from their partition
+        for namespace in namespaces:
+            if not missing:
+                break
+            vectors.update(self._fetch_vectors(missing, namespace))
+            missing = [vector_id for vector_id in missing if vector_id not in vectors]
+
+        # Candidates without a vector get a zero row: no redundancy penalty either way
+        candidate_vectors = np.zeros((len(matches), len(embedding)), dtype=np.float32)
+        for i, match in enumerate(matches):
+            if match[0] in vectors:
+                candidate_vectors[i] = vectors[match[0]]
+
+        if matches[0][3] is not None:
+            # Hybrid: fused scores carry the lexical signal, so use them (scaled to [0, 1]) as relevance
+            relevance = np.array([match[3] for match in matches], dtype=np.float32)
+            relevance /= relevance.max()
+        else:
+            relevance = candidate_vectors @ embedding
+
+        kept = collapse_near_duplicates(candidate_vectors, config.NEAR_DUPLICATE_THRESHOLD)
+        selected = maximal_marginal_relevance(relevance[kept], candidate_vectors[kept], k, config.MMR_LAMBDA)
+        if len(kept) < len(matches):
+            self.logger.debug(f"Collapsed {len(matches) - len(kept)} near-duplicate chunks")
+        return [matches[kept[i]] for i in selected]
+
+    def _rebuild_batch(self, records: List[Tuple[str, Dict]], namespace: str):
+        stored = self.doc_store.get_many(vector_id for vector_id, _ in records)
+        ids, texts, metadatas, legacy = [], [], [], []
+        for vector_id, metadata in records:
+            if vector_id in stored:
+                text = stored[vector_id][0]
+            elif metadata.get('text'):
+                # Written before the doc store existed: the text is still in the index
+                text = metadata['text']
+                legacy.append((vector_id, text, metadata))
+            else:
+                continue
+            ids.append(vector_id)
+            texts.append(text)
+            metadatas.append(self._index_metadata(metadata))
+        if legacy:
+            self.doc_store.put_many(*map(list, zip(*legacy)))
+        self.manifest.record([vector_id for vector_id, _ in records],
+                             [self._index_metadata(metadata) for _, metadata in records], namespace)
+        if self.lexical_index is not None and ids:
+            self.lexical_index.add(ids, texts, metadatas)
+
+    def rebuild_local_indexes(self):
+        """Rebuild the manifest and BM25 index and backfill the doc store from the vectors' records."""
+        self.manifest.clear()
+        if self.lexical_index is not None:
+            self.lexical_index.clear()
+        for namespace in all_namespaces():
+            batch = []
+            for record in self._iter_records(namespace):
+                batch.append(record)
+                if len(batch) >= 500:
+                    self._rebuild_batch(batch, namespace)
+                    batch = []
+            if batch:
+                self._rebuild_batch(batch, namespace)
+        self.manifest.mark_backfilled()
+        self.logger.info(
+            f"Rebuilt local indexes: {self.manifest.count()} chunks in the manifest, "
+            f"{self.doc_store.count()} in the doc store, "
+            f"{self.lexical_index.count() if self.lexical_index is not None else 0} in the lexical index"
+        )
+
+    def ensure_local_indexes(self):
+        """Rebuild the local indexes unless they already cover everything in the vector store.
+
+        Chunks indexed before the manifest, doc store and hybrid search existed
+        would otherwise be invisible to change detection and deletes, so every
+        ingestion entry point calls this before writing.
+        """
+        if not self.manifest.is_backfilled():
+            self.logger.info("Local indexes have not been backfilled, rebuilding them from the vector store...")
+        elif self.lexical_index is not None and self.lexical_index.count() == 0 and self.manifest.count():
+            self.logger.info("Lexical index is empty, rebuilding local indexes from the vector store...")
+        else:
+            return
+        self.rebuild_local_indexes()
+
+    def get_existing_hashes(self) -> Dict[str, str]:
+        """Get a mapping of section names to content hashes for change detection."""
+        try:
+            if self.manifest.is_backfilled():
+                return self.manifest.section_hashes()
+
+            # Manifest never rebuilt from the index, so it may miss older chunks: scan the index
+            self.logger.warning("Index manifest has not been backfilled; scanning the vector index for section hashes")
+            section_hashes = {}
+            for namespace in all_namespaces():
+                for metadata in self._scan_metadata({
+                    "section": {"$exists": True},
+                    "parent_hash": {"$exists": True}
+                }, namespace):
+                    # Extract unique section to hash mappings
+                    if "section" in metadata and "parent_hash" in metadata:
+                        section_hashes[metadata["section"]] = metadata["parent_hash"]
+
+            return section_hashes
+
+        except Exception as e:
+            self.logger.error(f"Error getting existing hashes: {str(e)}")
+            return {}
+
+    def delete_by_parent_hash(self, parent_hashes: List[str]) -> int:
+        """Delete all vectors associated with specific parent hashes (deleted content)."""
+        try:
+            deleted_count = 0
+
+            # Process in batches if there are many hashes
+            batch_size = 10
+            for i in range(0, len(parent_hashes), batch_size):
+                batch_hashes = parent_hashes[i:i + batch_size]
+
+                # Delete matching vectors, by id in their own partition when the manifest knows them
+                unknown_hashes = sorted(set(batch_hashes) - self.manifest.known_parent_hashes(batch_hashes))
+                ids_by_namespace = self.manifest.ids_for_parent_hashes(batch_hashes)
+                for namespace, ids in ids_by_namespace.items():
+                    deleted_count += self._delete_ids(ids, namespace)
+                    self.manifest.remove(ids)
+                # Hashes indexed before the manifest existed can only be found by filter, in any namespace
+                if unknown_hashes:
+                    for namespace in all_namespaces():
+                        deleted_count += self._delete({"parent_hash": {"$in": unknown_hashes}}, namespace)
+                self._bump_generation()
+                self.doc_store.delete_by_parent_hash(batch_hashes)
+                if self.lexical_index is not None:
+                    self.lexical_index.delete_by_parent_hash(batch_hashes)
+
+            return deleted_count
+
+        except Exception as e:
+            self.logger.error(f"Error deleting vectors by parent hash: {str(e)}")
+            return 0
+
+    def delete_superseded_versions(self, section_hashes: Dict[str, str]) -> int:
+        """Delete chunks left over from older content hashes of the given sections."""
+        stale_hashes = [
+            parent_hash
+            for section, current_hash in section_hashes.items()
+            for parent_hash in self.manifest.superseded_hashes(section, current_hash)
+        ]
+        if not stale_hashes:
+            return 0
+        return self.delete_by_parent_hash(stale_hashes)
+
+class VectorStore(BaseVectorStore):
+    """Pinecone-backed vector store."""
+
+    def __init__(self):
+        super().__init__()
+
         # Configure logging
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
@@ -56,7 +681,7 @@ class VectorStore:
                 self.logger.info(f"Creating Pinecone index: {config.PINECONE_INDEX_NAME}")
                 self.pc.create_index(
                     name=config.PINECONE_INDEX_NAME,
-                    dimension=config.EMBEDDING_DIMENSION,
+                    dimension=config.EMBEDDING_OUTPUT_DIMENSION,
                     metric='cosine',
                     spec=ServerlessSpec(
                         cloud='aws',
@@ -64,135 +689,85 @@ class VectorStore:
                     )
                 )
                 self.logger.info(f"Index {config.PINECONE_INDEX_NAME} created successfully")
+            else:
+                # A truncated-dimension config cannot write into a full-width index (or vice versa)
+                index_dimension = self.pc.describe_index(config.PINECONE_INDEX_NAME).dimension
+                if index_dimension != config.EMBEDDING_OUTPUT_DIMENSION:
+                    raise ValueError(
+                        f"Pinecone index {config.PINECONE_INDEX_NAME} has dimension {index_dimension}, "
+                        f"but config.EMBEDDING_OUTPUT_DIMENSION is {config.EMBEDDING_OUTPUT_DIMENSION}; "
+                        f"point config.PINECONE_INDEX_NAME at a new index for a different output dimension"
+                    )
         
         except Exception as e:
             self.logger.error(f"Error ensuring index exists: {str(e)}")
             raise
     
-    def _initialize_cache(self):
-        """Initialize an in-memory cache for frequent queries."""
-        self.cache = {}
-        self.cache_size = 1000  # This can be Adjusted based on our needs
-    
-    def _get_cache_key(self, query: str) -> str:
-        """Generate a cache key for a query."""
-        return str(hash(query))
-    
-    def add_documents(self, documents: List[Dict[str, str]], embeddings: List[List[float]]):
-        """Add documents and their embeddings to Pinecone with improved error handling."""
-        try:
-            batch_size = 100
-            for i in range(0, len(documents), batch_size):
-                batch_docs = documents[i:i + batch_size]
-                batch_embeddings = embeddings[i:i + batch_size]
-                
-                vectors = []
-                for doc, embedding in zip(batch_docs, batch_embeddings):
-                    vectors.append({
-                        'id': doc['metadata'].get('chunk_id', str(hash(doc['text']))),
-                        'values': embedding,
-                        'metadata': {
-                            'text': doc['text'],
-                            **doc.get('metadata', {})
-                        }
-                    })
-                
-                try:
-                    self.index.upsert(vectors=vectors)
-                    self.logger.info(f"Successfully upserted {len(vectors)} vectors")
-                except Exception as batch_error:
-                    self.logger.error(f"Error upserting batch: {str(batch_error)}")
-        
-        except Exception as e:
-            self.logger.error(f"Document addition error: {str(e)}")
-            raise
+    def _upsert(self, ids: List[str], embeddings: np.ndarray, metadatas: List[Dict], namespace: str = ""):
+        self.index.upsert(vectors=[
+            {
+                'id': vector_id,
+                'values': vector_to_transport(embedding, config.VECTOR_TRANSPORT_DTYPE),
+                'metadata': metadata
+            }
+            for vector_id, embedding, metadata in zip(ids, embeddings, metadatas)
+        ], namespace=namespace)
 
-    def search(self, query: str, embedding: List[float], k: int = 3) -> List[Dict]:
-        """Enhanced search with better source handling."""
-        try:
-            results = self.index.query(
-                vector=embedding,
-                top_k=k,
-                include_metadata=True
-            )
-            
-            processed_results = []
-            for match in results.matches:
-                metadata = match.metadata or {}
-                
-                # Enhance metadata with heading information if available
-                if 'text' in metadata and 'headings' in metadata:
-                    text = metadata['text']
-                    for heading in metadata['headings']:
-                        if heading['text'].lower() in text.lower():
-                            metadata['url'] = f"{metadata.get('url', '')}#{heading['id']}"
-                            break
-                
-                processed_results.append({
-                    'text': metadata.get('text', ''),
-                    'metadata': metadata,
-                    'distance': 1 - match.score
-                })
-            
-            return processed_results
-        except Exception as e:
-            self.logger.error(f"Search error: {str(e)}")
-            return []
-    
-    def get_existing_hashes(self) -> Dict[str, str]:
-        """Get a mapping of section names to content hashes for change detection."""
-        try:
-            # Query for metadata containing hash information
-            section_hashes = {}
-            
-            # Use a metadata filter to get distinct parent_hash values
-            results = self.index.query(
-                vector=[0.0] * config.EMBEDDING_DIMENSION,  # Dummy vector
-                top_k=1000,  # Get a large number to capture all sections
-                include_metadata=True,
-                filter={
-                    "section": {"$exists": True},
-                    "parent_hash": {"$exists": True}
-                }
-            )
-            
-            # Extract unique section to hash mappings
-            for match in results.matches:
-                if "section" in match.metadata and "parent_hash" in match.metadata:
-                    section = match.metadata["section"]
-                    parent_hash = match.metadata["parent_hash"]
-                    section_hashes[section] = parent_hash
-            
-            return section_hashes
-            
-        except Exception as e:
-            self.logger.error(f"Error getting existing hashes: {str(e)}")
-            return {}
-    
-    def delete_by_parent_hash(self, parent_hashes: List[str]) -> int:
-        """Delete all vectors associated with specific parent hashes (deleted content)."""
-        try:
-            deleted_count = 0
-            
-            # Process in batches if there are many hashes
-            batch_size = 10
-            for i in range(0, len(parent_hashes), batch_size):
-                batch_hashes = parent_hashes[i:i + batch_size]
-                
-                # Create a filter for this batch of hashes
-                delete_filter = {
-                    "parent_hash": {"$in": batch_hashes}
-                }
-                
-                # Delete matching vectors
-                result = self.index.delete(filter=delete_filter)
-                
-                # Track the number of deleted items
-                if hasattr(result, 'deleted_count'):
-                    deleted_count += result.deleted_count
-                
-            return deleted_count
-            
-        except Exception as e:
-            self.logger.error(f"Error deleting vectors by parent hash: {str(e)}")
-            return 0
\ No newline at end of file
+    def _query(self, embedding: np.ndarray, top_k: int, filter: Optional[Dict] = None, namespace: str = "",
+               include_values: bool = False) -> List[Tuple[str, float, Dict, Optional[np.ndarray]]]:
+        results = self.index.query(
+            vector=vector_to_transport(embedding, config.VECTOR_TRANSPORT_DTYPE),
+            top_k=top_k,
+            include_metadata=True,
+            include_values=include_values,
+            filter=filter,
+            namespace=namespace
+        )
+        return [
+            (match.id, match.score, match.metadata or {},
+             np.asarray(match.values, dtype=np.float32) if include_values else None)
+            for match in results.matches
+        ]
+
+    def _fetch_vectors(self, ids: List[str], namespace: str = "") -> Dict[str, np.ndarray]:
+        fetched = self.index.fetch(ids=ids, namespace=namespace)
+        return {
+            vector_id: np.asarray(vector.values, dtype=np.float32)
+            for vector_id, vector in fetched.vectors.items()
+        }
+
+    def _delete(self, filter: Dict, namespace: str = "") -> int:
+        result = self.index.delete(filter=filter, namespace=namespace)
+        return getattr(result, 'deleted_count', 0) or 0
+
+    def _delete_ids(self, ids: List[str], namespace: str = "") -> int:
+        # Pinecone accepts up to 1000 ids per delete request
+        for i in range(0, len(ids), 1000):
+            self.index.delete(ids=ids[i:i + 1000], namespace=namespace)
+        return len(ids)
+
+    def _scan_metadata(self, filter: Dict, namespace: str = "") -> List[Dict]:
+        # Pinecone has no metadata scan; a filtered query with a dummy vector
+        # returns up to top_k matching records
+        results = self.index.query(
+            vector=[0.0] * config.EMBEDDING_OUTPUT_DIMENSION,
+            top_k=1000,  # Get a large number to capture all sections
+            include_metadata=True,
+            filter=filter,
+            namespace=namespace
+        )
+        return [match.metadata or {} for match in results.matches]
+
+    def _iter_records(self, namespace: str = "") -> Iterator[Tuple[str, Dict]]:
+        # Serverless indexes list ids page by page; fetch their metadata per page
+        for ids in self.index.list(namespace=namespace):
+            fetched = self.index.fetch(ids=list(ids), namespace=namespace)
+            for vector_id, vector in fetched.vectors.items():
+                yield vector_id, vector.metadata or {}
+
+def create_vector_store() -> BaseVectorStore:
+    """Return the vector store selected by config.VECTOR_STORE_BACKEND."""
+    if config.VECTOR_STORE_BACKEND == "local":
+        from core.local_vector_store import LocalVectorStore
+        return LocalVectorStore()
+    return VectorStore()
@@ -0,0 +1,60 @@
+import pytest
+
+from utils.config import config
+from core import context_packer
+from core.context_packer import count_tokens, pack_context, pack_history, remove_overlap
+
+@pytest.fixture(autouse=True)
+def character_tokens(monkeypatch):
+    # The 4-characters-per-token estimate keeps budgets independent of tiktoken's BPE files
+    monkeypatch.setattr(context_packer, "_encoding", lambda model: None)
+    monkeypatch.setattr(config, "CONTEXT_MIN_CHUNK_TOKENS", 10)
+
+def words(start, count):
+    return " ".join(f"word{i}" for i in range(start, start + count))
+
+def doc(text, chunk_id):
+    return {"text": text, "metadata": {"chunk_id": chunk_id}}
+
+def test_remove_overlap_drops_duplicates_and_contained_chunks():
+    kept = [words(0, 40)]
+    assert remove_overlap(words(0, 40), kept) is None
+    assert remove_overlap("  WORD5   word6 word7 ", kept) is None
+
+def test_remove_overlap_strips_chunker_overlap():
+    first = words(0, 40)
+    # The chunker repeats the tail of one chunk at the head of the next
+    assert remove_overlap(words(30, 30), [first]) == words(40, 20)
+    assert remove_overlap(words(-20, 30), [first]) == words(-20, 20)
+    unrelated = words(100, 20)
+    assert remove_overlap(unrelated, [first]) == unrelated
+
+def test_pack_context_keeps_best_docs_whole_then_trims_then_drops():
+    context = [doc(words(0, 50), "a"), doc(words(0, 50), "dup"), doc(words(100, 50), "b"), doc(words(200, 50), "c")]
+    first_cost = count_tokens(f"CONTEXT 1:\n{words(0, 50)}\n")
+    budget = first_cost + 60
+
+    packed = pack_context(context, context_budget=budget, history_budget=0)
+
+    assert [d["metadata"]["chunk_id"] for d in packed["docs"]] == ["a", "b"]
+    assert packed["docs"][0]["text"] == words(0, 50)
+    assert words(100, 50).startswith(packed["docs"][1]["text"])
+    assert packed["docs"][1]["text"] != words(100, 50)
+    stats = packed["stats"]
+    assert stats["context_tokens"] <= budget
+    assert (stats["duplicates_removed"], stats["chunks_trimmed"], stats["chunks_dropped"]) == (1, 1, 1)
+    assert packed["context"].startswith("CONTEXT 1:\n") and "CONTEXT 2:\n" in packed["context"]
+
+def test_pack_history_pins_summary_and_keeps_newest_messages():
+    history = [{"role": "summary", "content": "Earlier: asked about trip purposes."}] + [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": words(i * 10, 10)} for i in range(6)
+    ]
+    expected = ["Summary: Earlier: asked about trip purposes.", f"User: {words(40, 10)}", f"Assistant: {words(50, 10)}"]
+    # Each kept line costs its tokens plus one for the joining newline
+    budget = sum(count_tokens(line) + 1 for line in expected)
+
+    packed = pack_history(history, budget)
+
+    assert packed["chat_history"].split("\n") == expected
+    assert packed["dropped"] == 4
+    assert packed["tokens"] <= budget
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from utils.config import config
+from core.local_vector_store import LocalVectorStore
+
+DIMENSION = 8
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "EMBEDDING_OUTPUT_DIMENSION", DIMENSION)
+    monkeypatch.setattr(config, "VECTOR_NAMESPACES_ENABLED", False)
+    monkeypatch.setattr(config, "DOC_STORE_PATH", tmp_path / "doc_store.db")
+    monkeypatch.setattr(config, "INDEX_MANIFEST_PATH", tmp_path / "index_manifest.db")
+    monkeypatch.setattr(config, "LEXICAL_INDEX_PATH", tmp_path / "lexical_index.db")
+    monkeypatch.setattr(config, "UPSERT_DEAD_LETTER_PATH", tmp_path / "dead_letter.jsonl")
+    vector_store = LocalVectorStore(tmp_path / "vectors")
+    yield vector_store
+    vector_store.close()
+
+def chunk(chunk_id, parent_hash):
+    return {"text": f"text of {chunk_id}", "metadata": {"chunk_id": chunk_id, "section": chunk_id, "parent_hash": parent_hash}}
+
+def stored_ids(store):
+    return sorted(vector_id for vector_id, _ in store._iter_records())
+
+def test_mixed_batch_deletes_manifest_and_legacy_hashes(store):
+    embeddings = np.eye(DIMENSION, dtype=np.float32)
+    store.add_documents([chunk("known-0", "known"), chunk("keep-0", "keep")], embeddings[:2])
+    # Written before the manifest existed: only the index knows about it
+    store._upsert(["legacy-0"], embeddings[2:3], [{"chunk_id": "legacy-0", "parent_hash": "legacy"}])
+    assert store.manifest.known_parent_hashes(["known", "legacy"]) == {"known"}
+
+    deleted = store.delete_by_parent_hash(["known", "legacy"])
+
+    assert deleted == 2
+    assert stored_ids(store) == ["keep-0"]
+    assert store.manifest.ids_for_parent_hashes(["known", "keep"]) == {"": ["keep-0"]}
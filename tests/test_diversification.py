@@ -0,0 +1,27 @@
+import numpy as np
+
+from core.retrieval_optimizer import collapse_near_duplicates, maximal_marginal_relevance
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+def test_collapse_keeps_first_of_each_near_duplicate_group():
+    vectors = np.stack([unit(1, 0, 0), unit(1, 0.01, 0), unit(0, 1, 0), unit(0, 1, 0.01), unit(0, 0, 1)])
+
+    assert collapse_near_duplicates(vectors, threshold=0.99) == [0, 2, 4]
+    assert collapse_near_duplicates(vectors, threshold=1.01) == [0, 1, 2, 3, 4]
+
+def test_mmr_starts_with_most_relevant_and_skips_redundant_candidates():
+    vectors = np.stack([unit(1, 0, 0), unit(1, 0.1, 0), unit(0, 1, 0)])
+    relevance = np.array([0.9, 0.85, 0.6])
+
+    assert maximal_marginal_relevance(relevance, vectors, k=2, lambda_mult=0.5) == [0, 2]
+    # Pure relevance ignores redundancy
+    assert maximal_marginal_relevance(relevance, vectors, k=2, lambda_mult=1.0) == [0, 1]
+
+def test_mmr_returns_at_most_the_candidates():
+    vectors = np.stack([unit(1, 0), unit(0, 1)])
+
+    assert sorted(maximal_marginal_relevance(np.array([0.2, 0.8]), vectors, k=5)) == [0, 1]
+    assert maximal_marginal_relevance(np.array([]), np.empty((0, 2)), k=3) == []
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from utils.config import config
+from core.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+from core.local_vector_store import LocalVectorStore
+
+DIMENSION = 8
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "EMBEDDING_OUTPUT_DIMENSION", DIMENSION)
+    monkeypatch.setattr(config, "VECTOR_NAMESPACES_ENABLED", False)
+    monkeypatch.setattr(config, "HYBRID_SEARCH_ENABLED", True)
+    monkeypatch.setattr(config, "MMR_ENABLED", False)
+    monkeypatch.setattr(config, "DOC_STORE_PATH", tmp_path / "doc_store.db")
+    monkeypatch.setattr(config, "INDEX_MANIFEST_PATH", tmp_path / "index_manifest.db")
+    monkeypatch.setattr(config, "LEXICAL_INDEX_PATH", tmp_path / "lexical_index.db")
+    monkeypatch.setattr(config, "UPSERT_DEAD_LETTER_PATH", tmp_path / "dead_letter.jsonl")
+    vector_store = LocalVectorStore(tmp_path / "vectors")
+    yield vector_store
+    vector_store.close()
+
+def chunk(chunk_id, text):
+    return {"text": text, "metadata": {"chunk_id": chunk_id, "section": chunk_id, "parent_hash": chunk_id}}
+
+def test_rrf_sums_reciprocal_ranks():
+    fused = dict(reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=3, rrf_k=60))
+
+    assert fused["a"] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused["b"] == pytest.approx(1 / 62)
+    assert fused["c"] == pytest.approx(1 / 63 + 1 / 61)
+
+def test_rrf_ranks_agreement_above_a_single_top_hit():
+    fused = reciprocal_rank_fusion([["dense-only", "both"], ["lexical-only", "both"]], k=2)
+
+    assert [doc_id for doc_id, _ in fused] == ["both", "dense-only"]
+    assert reciprocal_rank_fusion([["a", "b", "c"]], k=5) == reciprocal_rank_fusion([["a", "b", "c"]], k=3)
+    assert reciprocal_rank_fusion([], k=3) == []
+
+def test_tokenize_splits_codes_and_drops_stopwords():
+    assert tokenize("What is the TP-01 trip purpose?") == ["tp", "01", "trip", "purpose"]
+
+def test_bm25_prefers_rare_terms(tmp_path):
+    index = LexicalIndex(tmp_path / "lexical.db")
+    try:
+        index.add(
+            ["common", "rare"],
+            ["travel policy travel booking", "travel policy for division codes"],
+            [{"chunk_id": "common"}, {"chunk_id": "rare"}]
+        )
+        assert [doc_id for doc_id, _, _ in index.search("division travel", 2)] == ["rare", "common"]
+    finally:
+        index.close()
+
+def test_hybrid_search_returns_exact_term_match_missed_by_dense_retrieval(store, monkeypatch):
+    embeddings = np.eye(DIMENSION, dtype=np.float32)
+    store.add_documents(
+        [chunk("near", "Locations are managed in the admin area"), chunk("code", "Error code XJ-4471 means the rail fare expired")],
+        embeddings[:2]
+    )
+    # Dense retrieval only reaches the nearest chunk; the code is found by BM25 alone
+    monkeypatch.setattr(config, "HYBRID_CANDIDATES", 1)
+
+    results = store.search("XJ-4471", embeddings[0], k=2)
+
+    assert {result["text"] for result in results} == {
+        "Locations are managed in the admin area", "Error code XJ-4471 means the rail fare expired"
+    }
+    assert all("rrf_score" in result for result in results)
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from utils.config import config
+from core.local_vector_store import LocalVectorStore
+
+DIMENSION = 8
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "EMBEDDING_OUTPUT_DIMENSION", DIMENSION)
+    monkeypatch.setattr(config, "VECTOR_NAMESPACES_ENABLED", False)
+    monkeypatch.setattr(config, "DOC_STORE_PATH", tmp_path / "doc_store.db")
+    monkeypatch.setattr(config, "INDEX_MANIFEST_PATH", tmp_path / "index_manifest.db")
+    monkeypatch.setattr(config, "LEXICAL_INDEX_PATH", tmp_path / "lexical_index.db")
+    monkeypatch.setattr(config, "UPSERT_DEAD_LETTER_PATH", tmp_path / "dead_letter.jsonl")
+    vector_store = LocalVectorStore(tmp_path / "vectors")
+    yield vector_store
+    vector_store.close()
+
+def chunk(chunk_id, parent_hash):
+    return {"text": f"text of {chunk_id}", "metadata": {"chunk_id": chunk_id, "section": chunk_id, "parent_hash": parent_hash}}
+
+def test_partial_manifest_is_not_trusted_until_backfilled(store):
+    embeddings = np.eye(DIMENSION, dtype=np.float32)
+    # Written before the manifest existed: only the index knows about it
+    store._upsert(["legacy-0"], embeddings[:1], [{"chunk_id": "legacy-0", "section": "legacy-0", "parent_hash": "legacy"}])
+    store.add_documents([chunk("new-0", "new")], embeddings[1:2])
+    assert store.manifest.count() == 1
+
+    assert store.get_existing_hashes() == {"legacy-0": "legacy", "new-0": "new"}
+
+    store.ensure_local_indexes()
+
+    assert store.manifest.is_backfilled()
+    assert store.manifest.section_hashes() == {"legacy-0": "legacy", "new-0": "new"}
+    assert store.get_existing_hashes() == {"legacy-0": "legacy", "new-0": "new"}
+
+def test_backfill_marker_survives_reopen(store, tmp_path):
+    store.ensure_local_indexes()
+    store.close()
+
+    reopened = LocalVectorStore(tmp_path / "vectors")
+    try:
+        assert reopened.manifest.is_backfilled()
+    finally:
+        reopened.close()
+
+def test_search_drops_hits_without_text(store):
+    embeddings = np.eye(DIMENSION, dtype=np.float32)
+    store.add_documents([chunk("stored-0", "stored")], embeddings[:1])
+    # Slim metadata and no doc-store entry: the hit has no text to return
+    store._upsert(["orphan-0"], embeddings[1:2], [{"chunk_id": "orphan-0", "parent_hash": "orphan"}])
+
+    results = store.search("text of stored-0", embeddings[0] + embeddings[1], k=2)
+
+    assert [result["text"] for result in results] == ["text of stored-0"]
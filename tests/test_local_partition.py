@@ -0,0 +1,42 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from utils.config import config
+from core.local_vector_store import LocalPartition
+
+DIMENSION = 8
+
+@pytest.fixture(autouse=True)
+def dimension(monkeypatch):
+    monkeypatch.setattr(config, "EMBEDDING_OUTPUT_DIMENSION", DIMENSION)
+
+def replace_in_other_process(directory):
+    # Frees row 0 and claims it for a new record, as an ingestion run would
+    partition = LocalPartition(directory)
+    partition.delete_ids(["a"])
+    partition.upsert(["c"], np.eye(DIMENSION, dtype=np.float32)[2:3], [{"chunk_id": "c"}])
+    partition.close()
+
+def test_partition_sees_writes_from_another_process(tmp_path):
+    embeddings = np.eye(DIMENSION, dtype=np.float32)
+    partition = LocalPartition(tmp_path)
+    try:
+        partition.upsert(["a", "b"], embeddings[:2], [{"chunk_id": "a"}, {"chunk_id": "b"}])
+        assert partition.query(embeddings[0], 1)[0][0] == "a"
+
+        # fork keeps this process's config; the writer opens its own connection and memmap
+        writer = multiprocessing.get_context("fork").Process(target=replace_in_other_process, args=(tmp_path,))
+        writer.start()
+        writer.join()
+        assert writer.exitcode == 0
+
+        assert partition.count() == 2
+        assert partition.fetch(["a"]) == {}
+        match_id, score, metadata, _ = partition.query(embeddings[2], 1)[0]
+        assert (match_id, metadata) == ("c", {"chunk_id": "c"})
+        assert score == pytest.approx(1.0)
+        assert sorted(vector_id for vector_id, _ in partition.records()) == ["b", "c"]
+    finally:
+        partition.close()
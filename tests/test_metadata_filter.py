@@ -0,0 +1,49 @@
+import pytest
+
+from core.metadata_filter import matches_filter, validate_filter
+
+PDF_TABLE = {"source": "guide.pdf", "content_type": "table", "page_num": 4}
+WEB_PAGE = {"section": "travelers", "url": "https://example.com/travelers", "content_type": ["text", "faq"]}
+
+def test_empty_filter_matches_everything():
+    assert matches_filter(PDF_TABLE, None)
+    assert matches_filter(PDF_TABLE, {})
+
+def test_bare_value_is_equality():
+    assert matches_filter(PDF_TABLE, {"content_type": "table"})
+    assert not matches_filter(PDF_TABLE, {"content_type": "text"})
+    assert not matches_filter(PDF_TABLE, {"section": "travelers"})
+
+def test_comparison_operators():
+    assert matches_filter(PDF_TABLE, {"page_num": {"$gte": 4, "$lt": 5}})
+    assert not matches_filter(PDF_TABLE, {"page_num": {"$gt": 4}})
+    assert matches_filter(PDF_TABLE, {"source": {"$in": ["guide.pdf", "faq.pdf"]}})
+    assert not matches_filter(PDF_TABLE, {"source": {"$nin": ["guide.pdf"]}})
+    # Mismatched types never compare, rather than raising
+    assert not matches_filter(PDF_TABLE, {"source": {"$gt": 3}})
+
+def test_list_values_match_any_element():
+    assert matches_filter(WEB_PAGE, {"content_type": "faq"})
+    assert matches_filter(WEB_PAGE, {"content_type": {"$in": ["faq", "table"]}})
+    assert not matches_filter(WEB_PAGE, {"content_type": {"$ne": "text"}})
+    assert not matches_filter(WEB_PAGE, {"content_type": {"$nin": ["text"]}})
+
+def test_exists():
+    assert matches_filter(WEB_PAGE, {"section": {"$exists": True}})
+    assert matches_filter(PDF_TABLE, {"section": {"$exists": False}})
+    assert not matches_filter(PDF_TABLE, {"section": {"$exists": True}})
+
+def test_and_or():
+    either = {"$or": [{"content_type": "table"}, {"section": "travelers"}]}
+    assert matches_filter(PDF_TABLE, either)
+    assert matches_filter(WEB_PAGE, either)
+    assert not matches_filter(PDF_TABLE, {"$and": [{"content_type": "table"}, {"page_num": {"$gt": 10}}]})
+
+def test_validate_filter_rejects_unindexed_fields_and_unknown_operators():
+    validate_filter({"$and": [{"source": {"$in": ["guide.pdf"]}}, {"page_num": {"$lte": 3}}]})
+    with pytest.raises(ValueError):
+        validate_filter({"text": "anything"})
+    with pytest.raises(ValueError):
+        validate_filter({"source": {"$regex": "guide"}})
+    with pytest.raises(ValueError):
+        validate_filter({"source": {"$in": "guide.pdf"}})
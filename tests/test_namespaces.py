@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from utils.config import config
+from core.local_vector_store import LocalVectorStore
+
+DIMENSION = 8
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "EMBEDDING_OUTPUT_DIMENSION", DIMENSION)
+    monkeypatch.setattr(config, "VECTOR_NAMESPACES_ENABLED", False)
+    monkeypatch.setattr(config, "DOC_STORE_PATH", tmp_path / "doc_store.db")
+    monkeypatch.setattr(config, "INDEX_MANIFEST_PATH", tmp_path / "index_manifest.db")
+    monkeypatch.setattr(config, "LEXICAL_INDEX_PATH", tmp_path / "lexical_index.db")
+    monkeypatch.setattr(config, "UPSERT_DEAD_LETTER_PATH", tmp_path / "dead_letter.jsonl")
+    vector_store = LocalVectorStore(tmp_path / "vectors")
+    yield vector_store
+    vector_store.close()
+
+def chunk(chunk_id, parent_hash):
+    return {"text": f"text of {chunk_id}", "metadata": {"chunk_id": chunk_id, "section": chunk_id, "parent_hash": parent_hash}}
+
+def stored_ids(store, namespace):
+    return sorted(vector_id for vector_id, _ in store._iter_records(namespace))
+
+def test_reupsert_after_enabling_namespaces_deletes_old_copy(store, monkeypatch):
+    embeddings = np.eye(DIMENSION, dtype=np.float32)
+    store.add_documents([chunk("web-0", "hash")], embeddings[:1])
+    monkeypatch.setattr(config, "VECTOR_NAMESPACES_ENABLED", True)
+
+    store.add_documents([chunk("web-0", "hash")], embeddings[:1])
+
+    assert stored_ids(store, "") == []
+    assert stored_ids(store, "web") == ["web-0"]
+    assert store.manifest.ids_for_parent_hashes(["hash"]) == {"web": ["web-0"]}
+
+def test_migrate_namespaces_moves_default_namespace_vectors(store, monkeypatch):
+    embeddings = np.eye(DIMENSION, dtype=np.float32)
+    store.add_documents([chunk("web-0", "hash")], embeddings[:1])
+    monkeypatch.setattr(config, "VECTOR_NAMESPACES_ENABLED", True)
+
+    assert store.migrate_namespaces() == 1
+
+    assert stored_ids(store, "") == []
+    assert stored_ids(store, "web") == ["web-0"]
+    assert store.manifest.ids_for_parent_hashes(["hash"]) == {"web": ["web-0"]}
+    results = store.search("text of web-0", embeddings[0], k=1)
+    assert [result["text"] for result in results] == ["text of web-0"]
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from utils.config import config
+from core.local_vector_store import LocalVectorStore
+
+DIMENSION = 8
+
+@pytest.fixture
+def paths(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "EMBEDDING_OUTPUT_DIMENSION", DIMENSION)
+    monkeypatch.setattr(config, "VECTOR_NAMESPACES_ENABLED", False)
+    monkeypatch.setattr(config, "HYBRID_SEARCH_ENABLED", False)
+    monkeypatch.setattr(config, "DOC_STORE_PATH", tmp_path / "doc_store.db")
+    monkeypatch.setattr(config, "INDEX_MANIFEST_PATH", tmp_path / "index_manifest.db")
+    monkeypatch.setattr(config, "UPSERT_DEAD_LETTER_PATH", tmp_path / "dead_letter.jsonl")
+    return tmp_path
+
+def chunk(chunk_id, parent_hash):
+    return {"text": f"text of {chunk_id}", "metadata": {"chunk_id": chunk_id, "section": chunk_id, "parent_hash": parent_hash}}
+
+def test_cached_results_are_invalidated_by_another_writer(paths):
+    embeddings = np.eye(DIMENSION, dtype=np.float32)
+    reader = LocalVectorStore(paths / "vectors")
+    writer = LocalVectorStore(paths / "vectors")
+    try:
+        writer.add_documents([chunk("a-0", "a")], embeddings[:1])
+        assert [result["text"] for result in reader.search("a", embeddings[0], k=1)] == ["text of a-0"]
+
+        # Without the lexical index, only the manifest and doc store see this write
+        writer.delete_by_parent_hash(["a"])
+
+        assert reader.search("a", embeddings[0], k=1) == []
+    finally:
+        writer.close()
+        reader.close()
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from utils.config import config
+from core.local_vector_store import LocalVectorStore
+
+DIMENSION = 8
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "EMBEDDING_OUTPUT_DIMENSION", DIMENSION)
+    monkeypatch.setattr(config, "VECTOR_NAMESPACES_ENABLED", False)
+    monkeypatch.setattr(config, "UPSERT_BACKOFF_SECONDS", 0)
+    monkeypatch.setattr(config, "DOC_STORE_PATH", tmp_path / "doc_store.db")
+    monkeypatch.setattr(config, "INDEX_MANIFEST_PATH", tmp_path / "index_manifest.db")
+    monkeypatch.setattr(config, "LEXICAL_INDEX_PATH", tmp_path / "lexical_index.db")
+    monkeypatch.setattr(config, "UPSERT_DEAD_LETTER_PATH", tmp_path / "dead_letter.jsonl")
+    vector_store = LocalVectorStore(tmp_path / "vectors")
+    yield vector_store
+    vector_store.close()
+
+def chunk(chunk_id, parent_hash):
+    return {"text": f"text of {chunk_id}", "metadata": {"chunk_id": chunk_id, "section": chunk_id, "parent_hash": parent_hash}}
+
+def test_failed_upsert_is_retried(store, monkeypatch):
+    upsert = store._upsert
+    calls = []
+
+    def flaky_upsert(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise ConnectionError("index unavailable")
+        return upsert(*args)
+
+    monkeypatch.setattr(store, "_upsert", flaky_upsert)
+    summary = store.add_documents([chunk("a-0", "a")], np.eye(DIMENSION, dtype=np.float32)[:1])
+
+    assert (summary["upserted"], summary["retries"], len(calls)) == (1, 1, 2)
+    assert store.manifest.ids_for_parent_hashes(["a"]) == {"": ["a-0"]}
+
+def test_local_bookkeeping_failure_is_not_retried_or_dead_lettered(store, monkeypatch):
+    upsert = store._upsert
+    calls = []
+    monkeypatch.setattr(store, "_upsert", lambda *args: calls.append(args) or upsert(*args))
+
+    def broken_record(*args):
+        raise RuntimeError("manifest is read-only")
+
+    monkeypatch.setattr(store.manifest, "record", broken_record)
+    with pytest.raises(RuntimeError):
+        store.add_documents([chunk("a-0", "a")], np.eye(DIMENSION, dtype=np.float32)[:1])
+
+    assert len(calls) == 1
+    assert not config.UPSERT_DEAD_LETTER_PATH.exists()
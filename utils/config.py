@@ -31,8 +31,66 @@ class Config:
     # EMBEDDING_MODEL = "BAAI/bge-large-en-v1.5" 
     # model_name = "Snowflake/snowflake-arctic-embed-l-v2.0"
     EMBEDDING_DIMENSION = 1024  # Adjust based on your specific embedding model
+    # Matryoshka truncation: vectors are cut to this many leading dimensions and renormalized.
+    # Changing it requires a fresh Pinecone index (see PINECONE_INDEX_NAME).
+    EMBEDDING_OUTPUT_DIMENSION = int(os.getenv("EMBEDDING_OUTPUT_DIMENSION", EMBEDDING_DIMENSION))
+    # "float16" rounds vectors to half precision for the cache and for upsert/query payloads
+    VECTOR_TRANSPORT_DTYPE = os.getenv("VECTOR_TRANSPORT_DTYPE", "float32")
     # EMBEDDING_MODEL = str(MODEL_DIR)
+    # Hard cap on tokens per forward sequence. Attention cost is quadratic in length,
+    # so this bounds worst-case embedding latency; longer inputs are split or truncated.
+    EMBEDDING_MAX_LENGTH = int(os.getenv("EMBEDDING_MAX_LENGTH", 512))
+    EMBEDDING_OVERLONG_STRATEGY = os.getenv("EMBEDDING_OVERLONG_STRATEGY", "split")  # or "truncate"
+    EMBEDDING_WINDOW_OVERLAP = int(os.getenv("EMBEDDING_WINDOW_OVERLAP", 64))  # tokens shared by adjacent windows
+    EMBEDDING_MAX_WINDOWS = int(os.getenv("EMBEDDING_MAX_WINDOWS", 16))  # beyond this, the tail is dropped
+    # Micro-batching: padded tokens (batch size x longest sequence) allowed per forward pass
+    EMBEDDING_BATCH_TOKEN_BUDGET = int(os.getenv("EMBEDDING_BATCH_TOKEN_BUDGET", 16384))
+    EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", 64))
+    # arctic-embed v2 expects the "query: " prefix on queries only. Existing indexes were built with
+    # it on documents too, so that stays the default: set EMBEDDING_DOCUMENT_PREFIX="" only together
+    # with a full re-index, or old and new chunks end up in two different embedding spaces.
+    EMBEDDING_QUERY_PREFIX = "query: "
+    EMBEDDING_DOCUMENT_PREFIX = os.getenv("EMBEDDING_DOCUMENT_PREFIX", "query: ")
+    # Inference backend: "torch" (eager PyTorch) or "onnx" (ONNX Runtime, exported once)
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+    EMBEDDING_ONNX_QUANTIZE = os.getenv("EMBEDDING_ONNX_QUANTIZE", "false").lower() == "true"
+    EMBEDDING_ONNX_DIR = BASE_DIR / "storage" / "onnx"  # one export per model and opset below this
+    # Multi-process embedding pool for bulk ingestion (0 or 1 = embed in-process).
+    # Each worker holds its own copy of the model, so size this to available RAM.
+    EMBEDDING_POOL_WORKERS = int(os.getenv("EMBEDDING_POOL_WORKERS", 0))
+    EMBEDDING_POOL_THREADS_PER_WORKER = int(os.getenv("EMBEDDING_POOL_THREADS_PER_WORKER", 0))  # 0 = cores / workers
+    EMBEDDING_POOL_SHARD_SIZE = int(os.getenv("EMBEDDING_POOL_SHARD_SIZE", 64))
+    # Persistent content-addressed embedding cache
+    EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_PATH = BASE_DIR / "storage" / "embedding_cache.db"
+    # In-process LRU of query embeddings on the API hot path
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 2048))
+    QUERY_EMBEDDING_CACHE_TTL = int(os.getenv("QUERY_EMBEDDING_CACHE_TTL", 24 * 3600))  # seconds
+    # Request-coalescing micro-batcher for concurrent API query embeddings
+    QUERY_BATCHING_ENABLED = os.getenv("QUERY_BATCHING_ENABLED", "true").lower() == "true"
+    QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", 5))
+    QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", 16))
     LLM_MODEL = "gpt-4.1-mini"
+    # Clarification check before answering: "heuristic" (local rules, no LLM call), "off"
+    # or "blocking" (an LLM call before generation, one extra round trip of latency).
+    # Flagged questions get clarifying questions back instead of an answer.
+    CLARIFICATION_MODE = os.getenv("CLARIFICATION_MODE", "heuristic")
+    # Prompt budgets in tokens of LLM_MODEL's tokenizer: best-ranked chunks are kept whole
+    # while they fit, the next is trimmed if at least CONTEXT_MIN_CHUNK_TOKENS remain, the
+    # rest dropped; history keeps the newest messages that fit
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+    CONTEXT_MIN_CHUNK_TOKENS = int(os.getenv("CONTEXT_MIN_CHUNK_TOKENS", 150))
+    HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 1000))
+    # Requests with a conversation_id send a rolling summary of older turns plus the last
+    # CONVERSATION_VERBATIM_TURNS exchanges; the summary is updated in the background after each turn
+    CONVERSATION_SUMMARY_ENABLED = os.getenv("CONVERSATION_SUMMARY_ENABLED", "true").lower() == "true"
+    CONVERSATION_VERBATIM_TURNS = int(os.getenv("CONVERSATION_VERBATIM_TURNS", 2))
+    CONVERSATION_SUMMARY_MAX_WORDS = int(os.getenv("CONVERSATION_SUMMARY_MAX_WORDS", 150))
+    # Generated answers keyed by question, retrieved chunk set and history; cached
+    # answers are replayed to streaming clients word by word
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 512))
+    ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", 6 * 3600))  # seconds
     
     # Document processing
     CHUNK_SIZE = 1000
@@ -45,6 +103,57 @@ class Config:
     PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
     PINECONE_ENVIRONMENT = os.getenv("PINECONE_ENVIRONMENT", "gcp-starter")
     PINECONE_INDEX_NAME = "tms-copilot" #os.getenv("PINECONE_INDEX_NAME", "indigo-assistant")
+
+    # Vector store backend: "pinecone" (hosted) or "local" (memory-mapped, in-process)
+    VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone")
+    LOCAL_VECTOR_STORE_DIR = DB_DIR / "local"
+    # Source partitions: web chunks and uploaded documents each get their own namespace,
+    # so re-indexing one source doesn't contend with queries over the other. Vectors
+    # written before enabling this stay in the default namespace, which is still
+    # searched, until re-upserted or moved with scheduled_update --migrate-namespaces.
+    VECTOR_NAMESPACES_ENABLED = os.getenv("VECTOR_NAMESPACES_ENABLED", "false").lower() == "true"
+    VECTOR_NAMESPACES = ["web", "documents"]
+    # Chunk text and full metadata live in a local doc store keyed by chunk_id;
+    # the vector index only stores these small, filterable fields
+    DOC_STORE_PATH = BASE_DIR / "storage" / "doc_store.db"
+    # Section -> content hash -> chunk ids of everything in the vector index
+    INDEX_MANIFEST_PATH = BASE_DIR / "storage" / "index_manifest.db"
+    VECTOR_METADATA_FIELDS = [
+        "source", "url", "section", "chunk_id", "chunk_index", "parent_hash", "content_hash",
+        "page_num", "content_type"
+    ]
+    # Hybrid retrieval: BM25 over chunk text fused with the dense results by reciprocal rank
+    HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+    LEXICAL_INDEX_PATH = BASE_DIR / "storage" / "lexical_index.db"
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 20))  # depth fetched from each retriever
+    HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", 60))
+    # Post-retrieval diversification: rank k x multiplier candidates, collapse near-duplicates
+    # (cosine >= threshold), then pick k by maximal marginal relevance (1.0 = pure relevance)
+    MMR_ENABLED = os.getenv("MMR_ENABLED", "true").lower() == "true"
+    MMR_CANDIDATE_MULTIPLIER = int(os.getenv("MMR_CANDIDATE_MULTIPLIER", 4))
+    MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", 0.7))
+    NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", 0.95))
+    # Optional cross-encoder rerank of the retrieved chunks before generation: the API
+    # retrieves RERANKER_CANDIDATES chunks and sends the best RERANKER_TOP_K (at most the
+    # request's context_window); passes slower than the budget keep retrieval order
+    RERANKER_ENABLED = os.getenv("RERANKER_ENABLED", "false").lower() == "true"
+    RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANKER_MAX_LENGTH = int(os.getenv("RERANKER_MAX_LENGTH", 256))  # tokens per (query, chunk) pair
+    RERANKER_CANDIDATES = int(os.getenv("RERANKER_CANDIDATES", 20))
+    RERANKER_TOP_K = int(os.getenv("RERANKER_TOP_K", 3))
+    RERANKER_BUDGET_MS = float(os.getenv("RERANKER_BUDGET_MS", 300))
+    # Search result cache; writes through this process invalidate it immediately,
+    # writes from other processes (ingestion runs) within the TTL
+    RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", 1024))
+    RETRIEVAL_CACHE_TTL = int(os.getenv("RETRIEVAL_CACHE_TTL", 600))  # seconds
+    # Upserts: batches are capped by count and by estimated request size (Pinecone
+    # rejects requests over 2 MB), sent concurrently and retried with backoff
+    UPSERT_MAX_BATCH_SIZE = int(os.getenv("UPSERT_MAX_BATCH_SIZE", 100))
+    UPSERT_MAX_BATCH_BYTES = int(os.getenv("UPSERT_MAX_BATCH_BYTES", 1_500_000))
+    UPSERT_CONCURRENCY = int(os.getenv("UPSERT_CONCURRENCY", 4))
+    UPSERT_MAX_RETRIES = int(os.getenv("UPSERT_MAX_RETRIES", 4))
+    UPSERT_BACKOFF_SECONDS = float(os.getenv("UPSERT_BACKOFF_SECONDS", 0.5))  # doubles per retry
+    UPSERT_DEAD_LETTER_PATH = BASE_DIR / "storage" / "upsert_dead_letter.jsonl"
     
     # App settings
     APP_TITLE = "TMS-Copilot"
@@ -1,6 +1,7 @@
 # # # utils/helpers.py
 import hashlib
 import re
+import numpy as np
 from typing import List, Dict, Any
 from urllib.parse import urljoin, urlparse, parse_qs, quote
 
@@ -8,6 +9,20 @@ def generate_document_id(content: str) -> str:
     """Generate a unique ID for a document based on its content."""
     return hashlib.md5(content.encode()).hexdigest()
 
+def truncate_embeddings(embeddings: np.ndarray, dimension: int) -> np.ndarray:
+    """Keep the leading Matryoshka dimensions of each row and renormalize to unit length."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)[:, :dimension]
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+def vector_to_transport(vector, dtype: str = "float32") -> List[float]:
+    """Serialize a vector for the network, at half precision when dtype is "float16"."""
+    if dtype == "float16":
+        # Round-trip through float16, then trim the decimals float16 cannot carry,
+        # so JSON payloads shrink along with the precision
+        return np.round(np.asarray(vector, dtype=np.float16).astype(np.float64), 4).tolist()
+    return np.asarray(vector, dtype=np.float32).tolist()
+
 def format_chat_history(history: List[Dict[str, Any]]) -> str:
     """Format chat history for context window."""
     formatted = []